@@ -1,7 +1,10 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from database import Database
+from database import Database, LeaderboardUnavailableError, RatingConflictError
 from elo_system import EloSystem
+from discovery import DiscoveryEngine
+from pagination import parse_limit
+from write_behind import WriteBehindQueue
 import json
 import os
 import base64
@@ -15,6 +18,13 @@ CORS(app)
 # Initialize database and Elo system
 db = Database()
 elo = EloSystem()
+discovery = DiscoveryEngine(db, elo)
+
+# Optional write-behind mode: /api/rate only commits the Elo updates before
+# responding; rating records and match detection are written in the background
+rating_log_queue = None
+if os.getenv('WRITE_BEHIND', '').lower() in ('1', 'true', 'yes'):
+    rating_log_queue = WriteBehindQueue(db.persist_rating_logs)
 
 # Configuration for file uploads
 UPLOAD_FOLDER = 'uploads'
@@ -66,14 +76,38 @@ def save_photo(photo_data, user_id):
         print(f"Error saving photo: {e}")
         return None
 
+def add_percentiles(users):
+    """Add each user's Elo percentile (share of users rated below them) from one read of the global histogram"""
+    try:
+        histogram = db.get_global_stats()['histogram']
+    except Exception as e:
+        print(f"Error computing percentile: {e}")
+        histogram = None
+    for user in users:
+        user['percentile'] = histogram.percentile_of(user['elo_rating']) if histogram else None
+    return users
+
+def add_percentile(user):
+    """Add one user's Elo percentile"""
+    return add_percentiles([user])[0]
+
 @app.route('/api/users', methods=['GET'])
 def get_users():
-    """Get all users ordered by Elo rating"""
+    """Get users ordered by Elo rating, one page at a time"""
     try:
-        users = db.get_all_users()
+        try:
+            limit = parse_limit(request.args.get('limit'), default=50, maximum=100)
+            users, next_cursor = db.list_users(limit, request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
         return jsonify({
             'success': True,
-            'users': users
+            'users': add_percentiles(users),
+            'next_cursor': next_cursor
         })
     except Exception as e:
         return jsonify({
@@ -104,7 +138,7 @@ def create_user():
         
         return jsonify({
             'success': True,
-            'user': user
+            'user': add_percentile(user)
         }), 201
     
     except Exception as e:
@@ -113,6 +147,42 @@ def create_user():
             'error': str(e)
         }), 500
 
+# Most user IDs accepted by one /api/users/batch request
+MAX_USER_BATCH = 500
+
+@app.route('/api/users/batch', methods=['POST'])
+def get_users_batch():
+    """Get several users by ID in one request"""
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('ids'), list):
+            return jsonify({
+                'success': False,
+                'error': 'ids list is required'
+            }), 400
+        
+        if len(data['ids']) > MAX_USER_BATCH:
+            return jsonify({
+                'success': False,
+                'error': f'At most {MAX_USER_BATCH} ids per request'
+            }), 400
+        
+        ids = [user_id for user_id in dict.fromkeys(data['ids']) if isinstance(user_id, str) and user_id]
+        users = db.get_users(ids)
+        
+        return jsonify({
+            'success': True,
+            'users': add_percentiles([users[user_id] for user_id in ids if user_id in users]),
+            'missing': [user_id for user_id in ids if user_id not in users]
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/users/<user_id>', methods=['GET'])
 def get_user(user_id):
     """Get a specific user"""
@@ -127,7 +197,7 @@ def get_user(user_id):
         
         return jsonify({
             'success': True,
-            'user': user
+            'user': add_percentile(user)
         })
     
     except Exception as e:
@@ -148,8 +218,17 @@ def discover_users(user_id):
                 'error': 'User not found'
             }), 404
         
+        try:
+            limit = parse_limit(request.args.get('limit'), default=20, maximum=100)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
         # Get users to rate
-        users_to_rate = db.get_users_to_rate(user_id)
+        users_to_rate = discovery.discover(current_user, limit)
+        add_percentiles(users_to_rate + [current_user])
         
         return jsonify({
             'success': True,
@@ -188,35 +267,45 @@ def rate_user():
                 'error': 'Rating must be between 1 and 10'
             }), 400
         
-        # Get current users
-        rater = db.get_user(rater_id)
-        rated = db.get_user(rated_id)
+        if rater_id == rated_id:
+            return jsonify({
+                'success': False,
+                'error': 'Users cannot rate themselves'
+            }), 400
         
-        if not rater or not rated:
+        # Update both Elo ratings and record the rating in one transaction
+        try:
+            result = db.record_rating(
+                rater_id, rated_id, rating, is_match, elo.calculate_new_ratings,
+                log_queue=rating_log_queue
+            )
+        except RatingConflictError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 409
+        
+        if not result:
             return jsonify({
                 'success': False,
                 'error': 'One or both users not found'
             }), 404
         
-        # Calculate new Elo ratings
-        new_rater_rating, new_rated_rating = elo.calculate_new_ratings(
-            rater['elo_rating'],
-            rated['elo_rating'],
-            rating,
-            is_match
-        )
-        
-        # Update ratings in database
-        db.update_elo_rating(rater_id, new_rater_rating)
-        db.update_elo_rating(rated_id, new_rated_rating)
-        
-        # Add the rating record
-        rating_id = db.add_rating(rater_id, rated_id, rating, is_match)
+        rater = result['rater']
+        rated = result['rated']
+        new_rater_rating = result['new_rater_rating']
+        new_rated_rating = result['new_rated_rating']
+        rating_id = result['rating_id']
         
         # Check for mutual match if this was a match
         mutual_match = False
         match_id = None
-        if is_match:
+        match_pending = False
+        if is_match and rating_log_queue:
+            # Detected by the write-behind worker; shows up in /matches
+            mutual_match = None
+            match_pending = True
+        elif is_match:
             mutual_match = db.check_mutual_match(rater_id, rated_id)
             if mutual_match:
                 match_id = db.create_match(rater_id, rated_id)
@@ -239,6 +328,7 @@ def rate_user():
             'rated_tier': new_rated_tier,
             'mutual_match': mutual_match,
             'match_id': match_id,
+            'match_pending': match_pending,
             'impact': impact
         })
     
@@ -248,20 +338,182 @@ def rate_user():
             'error': str(e)
         }), 500
 
+# Most ratings accepted by one /api/rate/batch request; record_ratings writes
+# at most 1 + 3 * 25 items in one transaction, under DynamoDB's limit of 100
+MAX_RATING_BATCH = 25
+
+@app.route('/api/rate/batch', methods=['POST'])
+def rate_users_batch():
+    """Submit an ordered list of ratings from one rater in a single request"""
+    try:
+        data = request.get_json()
+        
+        if not data or 'rater_id' not in data or not isinstance(data.get('ratings'), list):
+            return jsonify({
+                'success': False,
+                'error': 'rater_id and a ratings list are required'
+            }), 400
+        
+        if not data['ratings'] or len(data['ratings']) > MAX_RATING_BATCH:
+            return jsonify({
+                'success': False,
+                'error': f'ratings must contain between 1 and {MAX_RATING_BATCH} items'
+            }), 400
+        
+        rater_id = data['rater_id']
+        if not isinstance(rater_id, str) or not rater_id:
+            return jsonify({
+                'success': False,
+                'error': 'rater_id must be a non-empty string'
+            }), 400
+        
+        # Validate every item up front; invalid ones are reported, not applied
+        results = []
+        valid = []
+        for entry in data['ratings']:
+            if not isinstance(entry, dict) or not all(field in entry for field in ('rated_id', 'rating', 'is_match')):
+                results.append({'success': False, 'error': 'rated_id, rating, and is_match are required'})
+                continue
+            
+            if not isinstance(entry['rated_id'], str) or not entry['rated_id']:
+                results.append({'success': False, 'rated_id': entry['rated_id'], 'error': 'rated_id must be a non-empty string'})
+                continue
+            
+            try:
+                rating = int(entry['rating'])
+            except (TypeError, ValueError):
+                rating = 0
+            
+            if rating < 1 or rating > 10:
+                results.append({'success': False, 'rated_id': entry['rated_id'], 'error': 'Rating must be between 1 and 10'})
+            elif entry['rated_id'] == rater_id:
+                results.append({'success': False, 'rated_id': entry['rated_id'], 'error': 'Users cannot rate themselves'})
+            else:
+                results.append(None)
+                valid.append((entry['rated_id'], rating, bool(entry['is_match'])))
+        
+        if valid:
+            try:
+                batch = db.record_ratings(rater_id, valid, elo.calculate_new_ratings, log_queue=rating_log_queue)
+            except RatingConflictError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 409
+            
+            if not batch:
+                return jsonify({
+                    'success': False,
+                    'error': 'Rater not found'
+                }), 404
+            
+            rater_rating_before = batch['rater']['elo_rating']
+            new_rater_rating = batch['new_rater_rating']
+            applied = iter(zip(valid, batch['results']))
+            for i, result in enumerate(results):
+                if result is not None:
+                    continue
+                (rated_id, rating, is_match), outcome = next(applied)
+                if 'error' in outcome:
+                    results[i] = {'success': False, 'rated_id': rated_id, 'error': outcome['error']}
+                    continue
+                
+                match_pending = bool(is_match and rating_log_queue)
+                results[i] = {
+                    'success': True,
+                    'rated_id': rated_id,
+                    'rating_id': outcome['rating_id'],
+                    'new_rater_rating': round(outcome['rater_rating'], 2),
+                    'new_rated_rating': round(outcome['rated_rating'], 2),
+                    'rating_change_rated': round(outcome['rated_rating'] - outcome['rated_rating_before'], 2),
+                    'rated_tier': elo.get_attractiveness_tier(outcome['rated_rating']),
+                    'mutual_match': None if match_pending else outcome['match_id'] is not None,
+                    'match_id': outcome['match_id'],
+                    'match_pending': match_pending
+                }
+        else:
+            rater = db.get_user(rater_id)
+            if not rater:
+                return jsonify({
+                    'success': False,
+                    'error': 'Rater not found'
+                }), 404
+            rater_rating_before = new_rater_rating = rater['elo_rating']
+        
+        return jsonify({
+            'success': True,
+            'results': results,
+            'applied': sum(1 for result in results if result['success']),
+            'new_rater_rating': round(new_rater_rating, 2),
+            'rating_change_rater': round(new_rater_rating - rater_rating_before, 2),
+            'rater_tier': elo.get_attractiveness_tier(new_rater_rating)
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/leaderboard', methods=['GET'])
 def get_leaderboard():
-    """Get users ranked by Elo rating"""
+    """Get users ranked by Elo rating, one page at a time"""
     try:
-        users = db.get_all_users()  # Already ordered by Elo rating DESC
+        try:
+            limit = parse_limit(request.args.get('limit'), default=50, maximum=100)
+            users, next_cursor = db.get_leaderboard(limit, request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         
-        # Add rank and tier to each user
-        for i, user in enumerate(users):
-            user['rank'] = i + 1
+        # Add tier and percentile to each user (rank comes from the index order)
+        for user in add_percentiles(users):
             user['tier'] = elo.get_attractiveness_tier(user['elo_rating'])
         
         return jsonify({
             'success': True,
-            'leaderboard': users
+            'leaderboard': users,
+            'next_cursor': next_cursor
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/leaderboard/top', methods=['GET'])
+def get_top_ranked():
+    """Get users by rank from the in-process rank index, starting at any offset"""
+    try:
+        try:
+            limit = parse_limit(request.args.get('limit'), default=10, maximum=100)
+            offset = int(request.args.get('offset') or 0)
+            if offset < 0:
+                raise ValueError
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'limit and offset must be non-negative integers'
+            }), 400
+        
+        try:
+            users = db.get_top_ranked(limit, offset)
+        except LeaderboardUnavailableError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 503
+        
+        for user in add_percentiles(users):
+            user['tier'] = elo.get_attractiveness_tier(user['elo_rating'])
+        
+        return jsonify({
+            'success': True,
+            'leaderboard': users,
+            'offset': offset
         })
     
     except Exception as e:
@@ -274,26 +526,31 @@ def get_leaderboard():
 def get_stats():
     """Get general app statistics"""
     try:
-        users = db.get_all_users()
+        global_stats = db.get_global_stats()
+        user_count = global_stats['user_count']
+        histogram = global_stats['histogram']
         
-        if not users:
+        if not user_count:
             return jsonify({
                 'success': True,
                 'stats': {
                     'total_users': 0,
                     'highest_elo': 0,
                     'lowest_elo': 0,
-                    'average_elo': 0
+                    'average_elo': 0,
+                    'percentiles': {}
                 }
             })
         
-        elo_ratings = [user['elo_rating'] for user in users]
-        
+        # Highest/lowest come from the histogram, so they are exact to one bucket
         stats = {
-            'total_users': len(users),
-            'highest_elo': max(elo_ratings),
-            'lowest_elo': min(elo_ratings),
-            'average_elo': round(sum(elo_ratings) / len(elo_ratings), 2)
+            'total_users': user_count,
+            'highest_elo': histogram.highest,
+            'lowest_elo': histogram.lowest,
+            'average_elo': round(global_stats['elo_sum'] / user_count, 2),
+            'percentiles': {
+                f'p{p}': histogram.percentile(p) for p in (10, 25, 50, 75, 90, 99)
+            }
         }
         
         return jsonify({
@@ -307,37 +564,99 @@ def get_stats():
             'error': str(e)
         }), 500
 
+@app.route('/api/stats/distribution', methods=['GET'])
+def get_elo_distribution():
+    """Get the Elo distribution as histogram buckets plus users per tier"""
+    try:
+        global_stats = db.get_global_stats()
+        histogram = global_stats['histogram']
+        
+        # Tier thresholds are multiples of the bucket width, so whole buckets map to one tier
+        tiers = {}
+        for bucket in histogram.distribution():
+            tier = elo.get_attractiveness_tier(bucket['min_elo'])
+            tiers[tier] = tiers.get(tier, 0) + bucket['count']
+        
+        return jsonify({
+            'success': True,
+            'total_users': global_stats['user_count'],
+            'bucket_width': histogram.bucket_width,
+            'buckets': histogram.distribution(),
+            'tiers': tiers
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
+    response = {
         'success': True,
         'message': 'EloVe API is running!'
-    })
+    }
+    response['cache'] = db.cache.stats
+    response['global_stats'] = db.global_stats_health
+    if rating_log_queue:
+        response['write_behind'] = rating_log_queue.stats
+    return jsonify(response)
 
 @app.route('/api/users/<user_id>/stats', methods=['GET'])
 def get_user_stats(user_id):
     """Get detailed statistics for a user"""
     try:
-        # Check if user exists
-        user = db.get_user(user_id)
+        # User and statistics come from the same item
+        user, stats = db.get_user_with_stats(user_id)
         if not user:
             return jsonify({
                 'success': False,
                 'error': 'User not found'
             }), 404
         
-        # Get user statistics
-        stats = db.get_user_stats(user_id)
-        
-        # Add Elo tier information
+        # Add Elo tier and leaderboard position
         tier = elo.get_attractiveness_tier(user['elo_rating'])
+        rank = db.get_user_rank(user_id)
         
         return jsonify({
             'success': True,
-            'user': user,
+            'user': add_percentile(user),
             'stats': stats,
-            'attractiveness_tier': tier
+            'attractiveness_tier': tier,
+            'rank': rank['rank'] if rank else None
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/users/<user_id>/rank', methods=['GET'])
+def get_user_rank(user_id):
+    """Get a user's current leaderboard rank"""
+    try:
+        try:
+            rank = db.get_user_rank(user_id)
+        except LeaderboardUnavailableError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 503
+        
+        if not rank:
+            return jsonify({
+                'success': False,
+                'error': 'User not found'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'user_id': user_id,
+            'rank': rank['rank'],
+            'total_users': rank['total_users']
         })
     
     except Exception as e:
@@ -359,12 +678,19 @@ def get_rating_history(user_id):
             }), 404
         
         # Get rating history
-        limit = int(request.args.get('limit', 50))
-        history = db.get_rating_history(user_id, limit)
+        try:
+            limit = parse_limit(request.args.get('limit'), default=50, maximum=100)
+            history, next_cursor = db.get_rating_history(user_id, limit, request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         
         return jsonify({
             'success': True,
-            'history': history
+            'history': history,
+            'next_cursor': next_cursor
         })
     
     except Exception as e:
@@ -386,12 +712,27 @@ def get_user_matches(user_id):
             }), 404
         
         # Get matches
-        matches = db.get_matches_for_user(user_id)
+        try:
+            limit = parse_limit(request.args.get('limit'), default=50, maximum=100)
+            matches, next_cursor = db.get_matches_for_user(user_id, limit, request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        # Hydrate the other user of every match with one batch read
+        other_ids = [match['user2_id'] if match['user1_id'] == user_id else match['user1_id'] for match in matches]
+        other_users = db.get_users(other_ids)
+        add_percentiles(other_users.values())
+        for match, other_id in zip(matches, other_ids):
+            match['other_user'] = other_users.get(other_id)
         
         return jsonify({
             'success': True,
             'matches': matches,
-            'total_matches': len(matches)
+            'total_matches': len(matches),
+            'next_cursor': next_cursor
         })
     
     except Exception as e:
@@ -608,17 +949,22 @@ if __name__ == '__main__':
     print("Starting EloVe Dating App API...")
     print("Available endpoints:")
     print("- GET /api/health - Health check")
-    print("- GET /api/users - Get all users")
+    print("- GET /api/users?limit=&cursor= - Get users by Elo (paginated)")
     print("- POST /api/users - Create new user")
+    print("- POST /api/users/batch - Get several users by ID")
     print("- GET /api/users/<id> - Get specific user")
-    print("- GET /api/users/<id>/discover - Get users to rate")
+    print("- GET /api/users/<id>/discover?limit= - Get users to rate")
     print("- GET /api/users/<id>/stats - Get user statistics")
-    print("- GET /api/users/<id>/history - Get user rating history")
-    print("- GET /api/users/<id>/matches - Get user matches")
+    print("- GET /api/users/<id>/rank - Get user leaderboard rank")
+    print("- GET /api/users/<id>/history?limit=&cursor= - Get user rating history (paginated)")
+    print("- GET /api/users/<id>/matches?limit=&cursor= - Get user matches (paginated)")
     print("- POST /api/rate - Rate a user")
+    print("- POST /api/rate/batch - Submit several ratings from one user")
     print("- POST /api/rate/preview - Preview rating impact")
-    print("- GET /api/leaderboard - Get Elo leaderboard")
+    print("- GET /api/leaderboard?limit=&cursor= - Get Elo leaderboard (paginated)")
+    print("- GET /api/leaderboard/top?limit=&offset= - Get users by rank from the in-process index")
     print("- GET /api/stats - Get app statistics")
+    print("- GET /api/stats/distribution - Get Elo distribution")
     print("- POST /api/photos/upload - Upload a photo")
     print("- GET /api/users/<id>/photos - Get user photos")
     print("- DELETE /api/photos/<id> - Delete a photo")
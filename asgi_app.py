@@ -0,0 +1,411 @@
+"""
+Async (ASGI) server mode for the EloVe API
+
+The hot routes (profile, stats, leaderboard, rating and rating preview) are
+served by async handlers whose independent DynamoDB calls run concurrently
+through AsyncDatabase, so a slow call no longer holds a worker thread and
+one process can keep many swipes in flight. Every other /api route is passed
+to the Flask app in app.py through a WSGI bridge, so both modes expose the
+same API and share one Database (and its caches) per process.
+
+Run with:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000 --workers 4
+"""
+
+import asyncio
+import functools
+import io
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from urllib.parse import parse_qs
+
+from app import app as flask_app, db, elo, rating_log_queue
+from database import RatingConflictError
+from pagination import parse_limit
+
+
+class AsyncDatabase:
+    """
+    Awaitable view of a Database: every method runs on a thread pool sized
+    to the DynamoDB connection pool, so handlers can await calls without
+    blocking the event loop and gather independent ones
+
+    boto3 has no native asyncio support; the pooled, thread-safe client from
+    dynamodb_config makes concurrent calls from these threads cheap.
+    """
+
+    def __init__(self, db, max_workers=None):
+        self.db = db
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv('ASYNC_DB_WORKERS', '32')),
+            thread_name_prefix='dynamodb'
+        )
+
+    async def run(self, function, *args, **kwargs):
+        """Run a blocking callable on the pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+        return call
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+adb = AsyncDatabase(db)
+
+
+class Request:
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.method = scope['method']
+        self.path = scope['path']
+        self.body = body
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        self.args = {name: values[0] for name, values in query.items()}
+
+    def get_json(self):
+        """Parsed JSON body, or None if it is missing or malformed"""
+        try:
+            return json.loads(self.body) if self.body else None
+        except ValueError:
+            return None
+
+
+def _json_default(value):
+    # Same as Flask's JSON provider, so both modes serialize alike
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+async def send_json(send, payload, status=200):
+    body = json.dumps(payload, default=_json_default).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('latin-1')),
+            (b'access-control-allow-origin', b'*')
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def global_histogram():
+    """Elo histogram for percentiles, or None if it cannot be read"""
+    try:
+        return (await adb.get_global_stats())['histogram']
+    except Exception as e:
+        print(f"Error computing percentile: {e}")
+        return None
+
+
+def with_percentile(user, histogram):
+    user['percentile'] = histogram.percentile_of(user['elo_rating']) if histogram else None
+    return user
+
+
+# Async handlers: each returns (payload, status)
+
+async def health_check(request):
+    """Health check endpoint"""
+    response = {
+        'success': True,
+        'message': 'EloVe API is running!',
+        'cache': db.cache.stats,
+        'global_stats': db.global_stats_health
+    }
+    if rating_log_queue:
+        response['write_behind'] = rating_log_queue.stats
+    return response, 200
+
+
+async def get_user(request, user_id):
+    """Get a specific user"""
+    user, histogram = await asyncio.gather(adb.get_user(user_id), global_histogram())
+
+    if not user:
+        return {'success': False, 'error': 'User not found'}, 404
+
+    return {'success': True, 'user': with_percentile(user, histogram)}, 200
+
+
+async def get_user_stats(request, user_id):
+    """Get detailed statistics for a user"""
+    # Profile with aggregates, rank and histogram are independent reads
+    (user, stats), rank, histogram = await asyncio.gather(
+        adb.get_user_with_stats(user_id),
+        adb.get_user_rank(user_id),
+        global_histogram()
+    )
+    if not user:
+        return {'success': False, 'error': 'User not found'}, 404
+
+    return {
+        'success': True,
+        'user': with_percentile(user, histogram),
+        'stats': stats,
+        'attractiveness_tier': elo.get_attractiveness_tier(user['elo_rating']),
+        'rank': rank['rank'] if rank else None
+    }, 200
+
+
+async def get_leaderboard(request):
+    """Get users ranked by Elo rating, one page at a time"""
+    try:
+        limit = parse_limit(request.args.get('limit'), default=50, maximum=100)
+        (users, next_cursor), histogram = await asyncio.gather(
+            adb.get_leaderboard(limit, request.args.get('cursor')),
+            global_histogram()
+        )
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}, 400
+
+    for user in users:
+        with_percentile(user, histogram)
+        user['tier'] = elo.get_attractiveness_tier(user['elo_rating'])
+
+    return {'success': True, 'leaderboard': users, 'next_cursor': next_cursor}, 200
+
+
+def parse_rating_request(data):
+    """Validate a rating body; returns ((rater_id, rated_id, rating, is_match), None) or (None, error)"""
+    required_fields = ['rater_id', 'rated_id', 'rating', 'is_match']
+    if not data or not all(field in data for field in required_fields):
+        return None, 'rater_id, rated_id, rating, and is_match are required'
+
+    rating = int(data['rating'])
+    if rating < 1 or rating > 10:
+        return None, 'Rating must be between 1 and 10'
+
+    return (data['rater_id'], data['rated_id'], rating, bool(data['is_match'])), None
+
+
+async def rate_user(request):
+    """Rate another user and update Elo ratings"""
+    parsed, error = parse_rating_request(request.get_json())
+    if error:
+        return {'success': False, 'error': error}, 400
+    rater_id, rated_id, rating, is_match = parsed
+
+    if rater_id == rated_id:
+        return {'success': False, 'error': 'Users cannot rate themselves'}, 400
+
+    # Both users are read with one BatchGetItem inside record_rating
+    try:
+        result = await adb.record_rating(
+            rater_id, rated_id, rating, is_match, elo.calculate_new_ratings,
+            log_queue=rating_log_queue
+        )
+    except RatingConflictError as e:
+        return {'success': False, 'error': str(e)}, 409
+
+    if not result:
+        return {'success': False, 'error': 'One or both users not found'}, 404
+
+    new_rater_rating = result['new_rater_rating']
+    new_rated_rating = result['new_rated_rating']
+
+    mutual_match = False
+    match_id = None
+    match_pending = False
+    if is_match and rating_log_queue:
+        mutual_match = None
+        match_pending = True
+    elif is_match:
+        mutual_match = await adb.check_mutual_match(rater_id, rated_id)
+        if mutual_match:
+            match_id = await adb.create_match(rater_id, rated_id)
+
+    return {
+        'success': True,
+        'rating_id': result['rating_id'],
+        'new_rater_rating': round(new_rater_rating, 2),
+        'new_rated_rating': round(new_rated_rating, 2),
+        'rating_change_rater': round(new_rater_rating - result['rater']['elo_rating'], 2),
+        'rating_change_rated': round(new_rated_rating - result['rated']['elo_rating'], 2),
+        'rater_tier': elo.get_attractiveness_tier(new_rater_rating),
+        'rated_tier': elo.get_attractiveness_tier(new_rated_rating),
+        'mutual_match': mutual_match,
+        'match_id': match_id,
+        'match_pending': match_pending,
+        'impact': elo.get_rating_impact(rating, is_match)
+    }, 200
+
+
+async def preview_rating_impact(request):
+    """Preview the impact of a rating before actually submitting it"""
+    parsed, error = parse_rating_request(request.get_json())
+    if error:
+        return {'success': False, 'error': error}, 400
+    rater_id, rated_id, rating, is_match = parsed
+
+    rater, rated = await asyncio.gather(adb.get_user(rater_id), adb.get_user(rated_id))
+    if not rater or not rated:
+        return {'success': False, 'error': 'One or both users not found'}, 404
+
+    new_rater_rating, new_rated_rating = elo.calculate_new_ratings(
+        rater['elo_rating'],
+        rated['elo_rating'],
+        rating,
+        is_match
+    )
+
+    return {
+        'success': True,
+        'current_rater_rating': rater['elo_rating'],
+        'current_rated_rating': rated['elo_rating'],
+        'projected_rater_rating': round(new_rater_rating, 2),
+        'projected_rated_rating': round(new_rated_rating, 2),
+        'rater_change': round(new_rater_rating - rater['elo_rating'], 2),
+        'rated_change': round(new_rated_rating - rated['elo_rating'], 2),
+        'impact_description': elo.get_rating_impact(rating, is_match),
+        'rater_tier': elo.get_attractiveness_tier(new_rater_rating),
+        'rated_tier': elo.get_attractiveness_tier(new_rated_rating)
+    }, 200
+
+
+ROUTES = [
+    ('GET', re.compile(r'^/api/health$'), health_check),
+    ('GET', re.compile(r'^/api/users/(?P<user_id>[^/]+)$'), get_user),
+    ('GET', re.compile(r'^/api/users/(?P<user_id>[^/]+)/stats$'), get_user_stats),
+    ('GET', re.compile(r'^/api/leaderboard$'), get_leaderboard),
+    ('POST', re.compile(r'^/api/rate$'), rate_user),
+    ('POST', re.compile(r'^/api/rate/preview$'), preview_rating_impact)
+]
+
+
+def match_route(method, path):
+    for route_method, pattern, handler in ROUTES:
+        if route_method == method:
+            match = pattern.match(path)
+            if match:
+                return handler, match.groupdict()
+    return None, None
+
+
+# WSGI bridge for every route without an async handler
+
+def wsgi_environ(scope, body):
+    """Build a PEP 3333 environ for an ASGI HTTP scope"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # PEP 3333: the percent-decoded path, as UTF-8 bytes carried in a latin-1 str
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'CONTENT_LENGTH':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def call_flask(environ):
+    """Run the Flask app for one request; returns (status code, headers, body)"""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = headers
+        return chunks.append
+
+    chunks = []
+    result = flask_app(environ, start_response)
+    try:
+        for chunk in result:
+            chunks.append(chunk)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], b''.join(chunks)
+
+
+async def bridge_to_flask(scope, body, send):
+    status, headers, response_body = await adb.run(call_flask, wsgi_environ(scope, body))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    })
+    await send({'type': 'http.response.body', 'body': response_body})
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    return body
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # Let queued rating writes land before the worker exits
+            if rating_log_queue:
+                await adb.run(rating_log_queue.close)
+            adb.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    body = await read_body(receive)
+    handler, params = match_route(scope['method'], scope['path'])
+    if handler is None:
+        await bridge_to_flask(scope, body, send)
+        return
+
+    try:
+        payload, status = await handler(Request(scope, body), **params)
+    except Exception as e:
+        payload, status = {'success': False, 'error': str(e)}, 500
+    await send_json(send, payload, status)
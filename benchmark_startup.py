@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Benchmark cold-start cost: how long a fresh interpreter takes to import
+app.py (what every gunicorn worker and test run pays before serving), and
+whether the import already touched DynamoDB
+
+Each run is a separate process so module caches start cold.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+import dynamodb_config
+print(elapsed, dynamodb_config._resource is not None)
+"""
+
+def measure(module, runs):
+    """Import `module` in `runs` fresh processes; returns (timings, connected)"""
+    timings = []
+    connected = False
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=module)],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+        elapsed, resource_created = result.stdout.strip().splitlines()[-1].split()
+        timings.append(float(elapsed))
+        connected = connected or resource_created == 'True'
+    return timings, connected
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the import time of the API server')
+    parser.add_argument('--runs', type=int, default=10, help='Fresh processes to time (default: 10)')
+    parser.add_argument('--module', default='app', help='Module to import (default: app)')
+    args = parser.parse_args()
+
+    timings, connected = measure(args.module, args.runs)
+    print(f"import {args.module}: median {statistics.median(timings) * 1000:.1f} ms, "
+          f"min {min(timings) * 1000:.1f} ms, max {max(timings) * 1000:.1f} ms over {args.runs} runs")
+    print(f"DynamoDB resource created during import: {'yes' if connected else 'no'}")
+
+if __name__ == "__main__":
+    main()
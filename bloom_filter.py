@@ -0,0 +1,85 @@
+import hashlib
+import math
+import struct
+
+# bit count, hash count, items added, capacity
+HEADER = struct.Struct('>IHII')
+
+
+class BloomFilter:
+    """
+    Compact probabilistic set of strings
+
+    Membership tests never give false negatives; false positives happen at
+    roughly `error_rate` while no more than `capacity` items have been added.
+    Serializes to a few bytes per item so it can live on a DynamoDB item.
+    """
+
+    def __init__(self, capacity=1000, error_rate=0.01):
+        """
+        capacity: Number of items the filter is sized for
+        error_rate: Target false-positive probability at capacity
+        """
+        capacity = max(1, int(capacity))
+        bit_count = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        hash_count = max(1, int(round(bit_count / capacity * math.log(2))))
+
+        self.capacity = capacity
+        self.bit_count = bit_count
+        self.hash_count = hash_count
+        self.count = 0
+        self.bits = bytearray((bit_count + 7) // 8)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a filter serialized with to_bytes"""
+        data = bytes(data)
+        bit_count, hash_count, count, capacity = HEADER.unpack_from(data)
+
+        bloom = cls.__new__(cls)
+        bloom.capacity = capacity
+        bloom.bit_count = bit_count
+        bloom.hash_count = hash_count
+        bloom.count = count
+        bloom.bits = bytearray(data[HEADER.size:])
+        if len(bloom.bits) != (bit_count + 7) // 8:
+            raise ValueError('Corrupt Bloom filter')
+        return bloom
+
+    def to_bytes(self):
+        header = HEADER.pack(self.bit_count, self.hash_count, self.count, self.capacity)
+        return header + bytes(self.bits)
+
+    def _positions(self, item):
+        # Double hashing: two 64-bit halves of one digest generate all k indexes
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = struct.unpack('>QQ', digest)
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.bit_count
+
+    def add(self, item):
+        """Add an item; returns False if it was (probably) already present"""
+        added = False
+        for position in self._positions(item):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, item):
+        for position in self._positions(item):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                return False
+        return True
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def is_saturated(self):
+        """True once more items were added than the filter was sized for"""
+        return self.count > self.capacity
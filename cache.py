@@ -0,0 +1,339 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class LRUCache:
+    """
+    Thread-safe in-process cache with a size bound (least recently used
+    entries are evicted first) and a per-entry time to live
+
+    Values are stored as given; callers that mutate what they read should
+    store and hand out copies.
+    """
+
+    def __init__(self, max_size=10000, ttl=30):
+        """
+        max_size: Most entries kept; 0 disables the cache
+        ttl: Default seconds an entry is served before it is read through again
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key, default=None):
+        """Cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._entries[key]
+            self._misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting the least recently used entries if full"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, *keys):
+        """Drop entries so the next read goes to the backing store"""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0
+            }
+
+
+class InProcessBackend:
+    """Cache backend local to one process, for single-worker deployments and development"""
+
+    name = 'memory'
+
+    def __init__(self, max_size=10000):
+        self._entries = LRUCache(max_size=max_size)
+        # Version counters must never be evicted, so they live outside the LRU
+        self._counters = {}
+        self._counters_lock = threading.Lock()
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def get_many(self, keys):
+        return [self._entries.get(key) for key in keys]
+
+    def set(self, key, value, ttl):
+        self._entries.set(key, value, ttl)
+
+    def delete(self, *keys):
+        self._entries.invalidate(*keys)
+
+    def get_counter(self, key, initial):
+        with self._counters_lock:
+            return self._counters.setdefault(key, initial)
+
+    def incr(self, key, initial):
+        with self._counters_lock:
+            self._counters[key] = self._counters.get(key, initial) + 1
+            return self._counters[key]
+
+    @property
+    def stats(self):
+        stats = self._entries.stats
+        return {'size': stats['size'], 'max_size': stats['max_size'], 'evictions': stats['evictions']}
+
+
+class RedisBackend:
+    """Cache backend shared by every worker through a Redis-protocol server"""
+
+    name = 'redis'
+
+    def __init__(self, client):
+        """client: redis.Redis (or compatible, e.g. fakeredis.FakeRedis in tests)"""
+        self.client = client
+
+    def get(self, key):
+        value = self.client.get(key)
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def get_many(self, keys):
+        values = self.client.mget(keys) if keys else []
+        return [value.decode('utf-8') if isinstance(value, bytes) else value for value in values]
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*keys)
+
+    def get_counter(self, key, initial):
+        # SET NX so concurrent workers agree on the starting value
+        self.client.set(key, initial, nx=True)
+        return int(self.client.get(key))
+
+    def incr(self, key, initial):
+        self.client.set(key, initial, nx=True)
+        return int(self.client.incr(key))
+
+    @property
+    def stats(self):
+        return {'size': self.client.dbsize()}
+
+
+def _encode_value(value):
+    if isinstance(value, Decimal):
+        return {'__decimal__': str(value)}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_object(obj):
+    if len(obj) == 1 and '__decimal__' in obj:
+        return Decimal(obj['__decimal__'])
+    return obj
+
+
+def encode(value):
+    """Serialize a cache value to JSON, keeping Decimals (DynamoDB numbers) as Decimal"""
+    return json.dumps(value, default=_encode_value, separators=(',', ':'))
+
+
+def decode(data):
+    return json.loads(data, object_hook=_decode_object)
+
+
+class Cache:
+    """
+    JSON value cache over a pluggable backend, with versioned scopes
+
+    Entries stored under a scope (e.g. 'elo' for leaderboard pages and stats)
+    include the scope's current version in their key. bump(scope) increments
+    the version in the backend, so with a shared backend one worker's Elo
+    update makes every worker's entries for that scope unreachable at once;
+    they then expire on their own.
+
+    Resolve the version with scope() before reading the database and pass
+    the same token to get() and set(): a value read before a concurrent bump
+    is then stored under the old version and never served.
+    """
+
+    def __init__(self, backend, prefix='elove', ttl=30):
+        """
+        backend: InProcessBackend or RedisBackend
+        prefix: Namespace for every key, so several apps can share a server
+        ttl: Default seconds entries live
+        """
+        self.backend = backend
+        self.prefix = prefix
+        self.ttl = ttl
+        self._stats_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._errors = 0
+
+    def _count(self, name):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _version_key(self, scope):
+        return f'{self.prefix}:version:{scope}'
+
+    def _initial_version(self):
+        # A counter lost on the server (eviction, restart) restarts from the
+        # clock rather than 0, so it does not land on versions still cached
+        return int(time.time() * 1000)
+
+    def _key(self, namespace, key, scope=None):
+        if scope is None:
+            return f'{self.prefix}:{namespace}:{key}'
+        return f'{self.prefix}:{namespace}:{scope}:{key}'
+
+    def scope(self, name):
+        """
+        Token for the current version of a scope, to pass to get()/set();
+        False if the backend is unavailable (get and set then skip the cache)
+        """
+        try:
+            return f'{name}{self.backend.get_counter(self._version_key(name), self._initial_version())}'
+        except Exception as e:
+            print(f"Error reading cache version: {e}")
+            self._count('_errors')
+            return False
+
+    def get(self, namespace, key, scope=None):
+        """Cached value, or None on a miss (or if the backend is unavailable)"""
+        if scope is False:
+            return None
+        try:
+            data = self.backend.get(self._key(namespace, key, scope))
+        except Exception as e:
+            print(f"Error reading cache: {e}")
+            self._count('_errors')
+            return None
+        if data is None:
+            self._count('_misses')
+            return None
+        self._count('_hits')
+        return decode(data)
+
+    def get_many(self, namespace, keys):
+        """{key: value} for the unscoped keys that are cached, in one backend round trip"""
+        try:
+            values = self.backend.get_many([self._key(namespace, key) for key in keys])
+        except Exception as e:
+            print(f"Error reading cache: {e}")
+            self._count('_errors')
+            return {}
+        found = {}
+        for key, data in zip(keys, values):
+            if data is None:
+                self._count('_misses')
+            else:
+                self._count('_hits')
+                found[key] = decode(data)
+        return found
+
+    def set(self, namespace, key, value, ttl=None, scope=None):
+        """Store a JSON-serializable value"""
+        if scope is False:
+            return
+        try:
+            self.backend.set(self._key(namespace, key, scope), encode(value), self.ttl if ttl is None else ttl)
+        except Exception as e:
+            print(f"Error writing cache: {e}")
+            self._count('_errors')
+
+    def invalidate(self, namespace, *keys):
+        """Drop unscoped entries for every worker sharing the backend"""
+        try:
+            self.backend.delete(*[self._key(namespace, key) for key in keys])
+        except Exception as e:
+            print(f"Error invalidating cache: {e}")
+            self._count('_errors')
+
+    def bump(self, scope):
+        """Invalidate every entry stored under scope"""
+        try:
+            self.backend.incr(self._version_key(scope), self._initial_version())
+        except Exception as e:
+            print(f"Error bumping cache version: {e}")
+            self._count('_errors')
+
+    @property
+    def stats(self):
+        """Backend name, hit/miss counters and backend size"""
+        with self._stats_lock:
+            lookups = self._hits + self._misses
+            stats = {
+                'backend': self.backend.name,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'errors': self._errors,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0
+            }
+        try:
+            stats.update(self.backend.stats)
+        except Exception as e:
+            print(f"Error reading cache stats: {e}")
+        return stats
+
+
+def create_cache():
+    """
+    Build the app cache from the environment: CACHE_BACKEND=memory (default)
+    or redis (shared across workers, at REDIS_URL); CACHE_SIZE bounds the
+    in-process backend and CACHE_TTL sets the default entry lifetime
+    """
+    ttl = float(os.getenv('CACHE_TTL', '30'))
+    backend_name = os.getenv('CACHE_BACKEND', 'memory').lower()
+
+    if backend_name == 'redis':
+        if redis is None:
+            raise ImportError("CACHE_BACKEND=redis requires the redis package (pip install redis)")
+        client = redis.Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+        return Cache(RedisBackend(client), ttl=ttl)
+
+    return Cache(InProcessBackend(max_size=int(os.getenv('CACHE_SIZE', '10000'))), ttl=ttl)
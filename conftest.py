@@ -0,0 +1,25 @@
+"""Shared pytest fixtures"""
+
+import os
+
+import pytest
+
+@pytest.fixture
+def db():
+    """Database backed by moto's in-memory DynamoDB, with every table created"""
+    moto = pytest.importorskip('moto')
+    import dynamodb_config
+    from database import Database
+    from setup_dynamodb import create_tables, table_names
+
+    for name, value in (('AWS_ACCESS_KEY_ID', 'testing'), ('AWS_SECRET_ACCESS_KEY', 'testing'),
+                        ('AWS_REGION', 'us-east-1')):
+        os.environ.setdefault(name, value)
+    os.environ.pop('DYNAMODB_ENDPOINT_URL', None)
+
+    with moto.mock_aws():
+        dynamodb_config._resource = dynamodb_config.create_resource()
+        resource = dynamodb_config.get_resource()
+        create_tables(resource, resource.meta.client, table_names())
+        yield Database()
+    dynamodb_config._resource = None
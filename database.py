@@ -1,211 +1,135 @@
-import boto3
 import uuid
 import os
+import threading
+import time
+import random
 from datetime import datetime
 from decimal import Decimal
-from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.conditions import Key
 from dotenv import load_dotenv
+from dynamodb_config import get_resource
+from pagination import encode_cursor, decode_cursor, paginate, fetch_page, parallel_scan
+from leaderboard import RankedLeaderboard
+from bloom_filter import BloomFilter
+from elo_histogram import EloHistogram
+from cache import create_cache
 
 # Load environment variables
 load_dotenv()
 
+# Key of the single item holding app-wide counters in the stats table
+GLOBAL_STATS_ID = 'global'
+
+# Every user item carries this fixed partition value so the elo-index GSI can
+# return users in Elo order with a single Query
+LEADERBOARD_PARTITION = 'LEADERBOARD'
+
+# Attributes used for indexing/bookkeeping that are never returned to clients
+INTERNAL_USER_ATTRIBUTES = ('leaderboard_pk', 'seen_filter', 'version')
+
+# Running per-user rating aggregates, maintained with ADD on every rating
+AGGREGATE_ATTRIBUTES = (
+    'ratings_given_count', 'ratings_given_sum', 'matches_given_count',
+    'ratings_received_count', 'ratings_received_sum', 'matches_received_count'
+)
+
+def rating_pair_key(rater_id, rated_id):
+    """
+    Key of the pair item recording that rater_id rated rated_id. Pair items live
+    in the ratings table but carry no rater_id/rated_id attributes, so they stay
+    out of the rater/rated indexes.
+    """
+    return f'PAIR#{rater_id}#{rated_id}'
+
+def match_key(user1_id, user2_id):
+    """Deterministic match ID for an (ordered) pair of users"""
+    return f'MATCH#{user1_id}#{user2_id}'
+
+class RatingConflictError(Exception):
+    """Raised when a rating keeps losing optimistic-concurrency races"""
+    pass
+
+class UnprocessedKeysError(Exception):
+    """Raised when BatchGetItem still reports unprocessed keys after every retry"""
+    pass
+
+class LeaderboardUnavailableError(Exception):
+    """Raised when the in-process rank index has never been loaded successfully"""
+    pass
+
 class Database:
     def __init__(self):
-        # AWS Configuration
-        aws_region = os.getenv('AWS_REGION', 'us-east-1')
-        aws_access_key = os.getenv('AWS_ACCESS_KEY_ID')
-        aws_secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
-        endpoint_url = os.getenv('DYNAMODB_ENDPOINT_URL')  # For local DynamoDB
-        
         # Table names
         self.users_table_name = os.getenv('USERS_TABLE', 'elove-users')
         self.ratings_table_name = os.getenv('RATINGS_TABLE', 'elove-ratings')
         self.matches_table_name = os.getenv('MATCHES_TABLE', 'elove-matches')
         self.photos_table_name = os.getenv('PHOTOS_TABLE', 'elove-photos')
+        self.stats_table_name = os.getenv('STATS_TABLE', 'elove-stats')
         
-        # Initialize DynamoDB client
-        session = boto3.Session(
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-            region_name=aws_region
+        # In-process rank index, kept current by Elo writes and periodically
+        # rebuilt from the users table
+        self.ranked_leaderboard = RankedLeaderboard(
+            reconcile_interval=int(os.getenv('LEADERBOARD_RECONCILE_SECONDS', '300'))
         )
+        self._reconcile_lock = threading.Lock()
         
-        if endpoint_url:
-            # For local development
-            self.dynamodb = session.resource('dynamodb', endpoint_url=endpoint_url)
-        else:
-            self.dynamodb = session.resource('dynamodb')
+        # Parallelism for full-table reads
+        self.scan_segments = int(os.getenv('SCAN_SEGMENTS', '4'))
+        self.scan_workers = int(os.getenv('SCAN_WORKERS', str(self.scan_segments)))
         
-        self.init_tables()
-    
-    def init_tables(self):
-        """Initialize DynamoDB tables"""
-        try:
-            # Create Users table
-            self.users_table = self.dynamodb.create_table(
-                TableName=self.users_table_name,
-                KeySchema=[
-                    {
-                        'AttributeName': 'id',
-                        'KeyType': 'HASH'
-                    }
-                ],
-                AttributeDefinitions=[
-                    {
-                        'AttributeName': 'id',
-                        'AttributeType': 'S'
-                    }
-                ],
-                BillingMode='PAY_PER_REQUEST'
-            )
-            print(f"Creating {self.users_table_name} table...")
-            self.users_table.wait_until_exists()
-            
-        except self.dynamodb.meta.client.exceptions.ResourceInUseException:
-            # Table already exists
-            self.users_table = self.dynamodb.Table(self.users_table_name)
+        # Read-through cache for user profiles, leaderboard pages and global
+        # stats (in-process, or shared by all workers with CACHE_BACKEND=redis).
+        # Profiles are invalidated per user; leaderboard pages and stats live
+        # under the 'elo' scope, which every Elo change bumps.
+        self.cache = create_cache()
         
-        try:
-            # Create Ratings table
-            self.ratings_table = self.dynamodb.create_table(
-                TableName=self.ratings_table_name,
-                KeySchema=[
-                    {
-                        'AttributeName': 'id',
-                        'KeyType': 'HASH'
-                    }
-                ],
-                AttributeDefinitions=[
-                    {
-                        'AttributeName': 'id',
-                        'AttributeType': 'S'
-                    },
-                    {
-                        'AttributeName': 'rater_id',
-                        'AttributeType': 'S'
-                    },
-                    {
-                        'AttributeName': 'rated_id',
-                        'AttributeType': 'S'
-                    }
-                ],
-                GlobalSecondaryIndexes=[
-                    {
-                        'IndexName': 'rater-index',
-                        'KeySchema': [
-                            {
-                                'AttributeName': 'rater_id',
-                                'KeyType': 'HASH'
-                            }
-                        ],
-                        'Projection': {
-                            'ProjectionType': 'ALL'
-                        }
-                    },
-                    {
-                        'IndexName': 'rated-index',
-                        'KeySchema': [
-                            {
-                                'AttributeName': 'rated_id',
-                                'KeyType': 'HASH'
-                            }
-                        ],
-                        'Projection': {
-                            'ProjectionType': 'ALL'
-                        }
-                    }
-                ],
-                BillingMode='PAY_PER_REQUEST'
-            )
-            print(f"Creating {self.ratings_table_name} table...")
-            self.ratings_table.wait_until_exists()
-            
-        except self.dynamodb.meta.client.exceptions.ResourceInUseException:
-            self.ratings_table = self.dynamodb.Table(self.ratings_table_name)
+        # Sizing of the per-user "already rated" Bloom filter
+        self.seen_filter_capacity = int(os.getenv('SEEN_FILTER_CAPACITY', '1000'))
+        self.seen_filter_error_rate = float(os.getenv('SEEN_FILTER_ERROR_RATE', '0.01'))
         
-        try:
-            # Create Matches table
-            self.matches_table = self.dynamodb.create_table(
-                TableName=self.matches_table_name,
-                KeySchema=[
-                    {
-                        'AttributeName': 'id',
-                        'KeyType': 'HASH'
-                    }
-                ],
-                AttributeDefinitions=[
-                    {
-                        'AttributeName': 'id',
-                        'AttributeType': 'S'
-                    },
-                    {
-                        'AttributeName': 'user1_id',
-                        'AttributeType': 'S'
-                    }
-                ],
-                GlobalSecondaryIndexes=[
-                    {
-                        'IndexName': 'user1-index',
-                        'KeySchema': [
-                            {
-                                'AttributeName': 'user1_id',
-                                'KeyType': 'HASH'
-                            }
-                        ],
-                        'Projection': {
-                            'ProjectionType': 'ALL'
-                        }
-                    }
-                ],
-                BillingMode='PAY_PER_REQUEST'
-            )
-            print(f"Creating {self.matches_table_name} table...")
-            self.matches_table.wait_until_exists()
-            
-        except self.dynamodb.meta.client.exceptions.ResourceInUseException:
-            self.matches_table = self.dynamodb.Table(self.matches_table_name)
+        # Nothing here talks to DynamoDB: the resource and table handles are
+        # created on first use, and tables are provisioned by
+        # `python setup_dynamodb.py migrate`
+        self._tables = {}
+        self._global_stats_ready = False
         
-        try:
-            # Create Photos table
-            self.photos_table = self.dynamodb.create_table(
-                TableName=self.photos_table_name,
-                KeySchema=[
-                    {
-                        'AttributeName': 'id',
-                        'KeyType': 'HASH'
-                    }
-                ],
-                AttributeDefinitions=[
-                    {
-                        'AttributeName': 'id',
-                        'AttributeType': 'S'
-                    },
-                    {
-                        'AttributeName': 'user_id',
-                        'AttributeType': 'S'
-                    }
-                ],
-                GlobalSecondaryIndexes=[
-                    {
-                        'IndexName': 'user-photos-index',
-                        'KeySchema': [
-                            {
-                                'AttributeName': 'user_id',
-                                'KeyType': 'HASH'
-                            }
-                        ],
-                        'Projection': {
-                            'ProjectionType': 'ALL'
-                        }
-                    }
-                ],
-                BillingMode='PAY_PER_REQUEST'
-            )
-            print(f"Creating {self.photos_table_name} table...")
-            self.photos_table.wait_until_exists()
-            
-        except self.dynamodb.meta.client.exceptions.ResourceInUseException:
-            self.photos_table = self.dynamodb.Table(self.photos_table_name)
+        # Failed global stats updates leave the counters drifted until
+        # repair_global_stats runs, so they are counted for /api/health
+        self._stats_failures_lock = threading.Lock()
+        self._stats_failures = 0
+        self._last_stats_failure = None
+    
+    def _table(self, name):
+        """Table handle, built on first use (no DynamoDB call is made)"""
+        table = self._tables.get(name)
+        if table is None:
+            table = self._tables[name] = self.dynamodb.Table(name)
+        return table
+    
+    @property
+    def dynamodb(self):
+        """Shared DynamoDB resource, created on first use (see dynamodb_config.py)"""
+        return get_resource()
+    
+    @property
+    def users_table(self):
+        return self._table(self.users_table_name)
+    
+    @property
+    def ratings_table(self):
+        return self._table(self.ratings_table_name)
+    
+    @property
+    def matches_table(self):
+        return self._table(self.matches_table_name)
+    
+    @property
+    def photos_table(self):
+        return self._table(self.photos_table_name)
+    
+    @property
+    def stats_table(self):
+        return self._table(self.stats_table_name)
     
     def create_user(self, name, age, bio="", photo_url=""):
         """Create a new user"""
@@ -218,35 +142,123 @@ class Database:
             'bio': bio,
             'photo_url': photo_url,
             'elo_rating': Decimal('1200.0'),
+            'leaderboard_pk': LEADERBOARD_PARTITION,
+            'version': 0,
             'created_at': datetime.utcnow().isoformat()
         }
         
         self.users_table.put_item(Item=item)
+        self.cache.invalidate('user', user_id)
+        self.ranked_leaderboard.update(user_id, item['elo_rating'])
+        self._record_elo_changes([(None, item['elo_rating'])])
         return user_id
     
+    def _clean_user(self, item):
+        """Prepare a raw user item for API responses"""
+        for attribute in INTERNAL_USER_ATTRIBUTES + AGGREGATE_ATTRIBUTES:
+            item.pop(attribute, None)
+        # Convert Decimal to float for JSON serialization
+        item['elo_rating'] = float(item['elo_rating'])
+        return item
+    
     def get_user(self, user_id):
-        """Get user by ID"""
+        """Get user by ID, served from the cache when possible"""
+        cached = self.cache.get('user', user_id)
+        if cached is not None:
+            return cached
+        
         try:
             response = self.users_table.get_item(Key={'id': user_id})
             if 'Item' in response:
-                item = response['Item']
-                # Convert Decimal to float for JSON serialization
-                item['elo_rating'] = float(item['elo_rating'])
-                return item
+                user = self._clean_user(response['Item'])
+                self.cache.set('user', user_id, user)
+                return user
             return None
         except Exception as e:
             print(f"Error getting user: {e}")
             return None
     
+    def _batch_get_items(self, table_name, keys, attempts=5, consistent=False):
+        """
+        Fetch raw items by id with BatchGetItem, 100 keys per request, retrying
+        any keys DynamoDB reports as unprocessed with exponential backoff
+        
+        Returns:
+            dict: id -> item for the keys that exist
+        
+        Raises:
+            UnprocessedKeysError: if keys are still unprocessed after every attempt,
+                so a throttled read is never mistaken for a missing item
+        """
+        items = {}
+        
+        for start in range(0, len(keys), 100):
+            request_items = {
+                table_name: {
+                    'Keys': keys[start:start + 100],
+                    'ConsistentRead': consistent
+                }
+            }
+            for attempt in range(attempts):
+                response = self.dynamodb.batch_get_item(RequestItems=request_items)
+                for item in response['Responses'].get(table_name, []):
+                    items[item['id']] = item
+                request_items = response.get('UnprocessedKeys')
+                if not request_items:
+                    break
+                if attempt < attempts - 1:
+                    time.sleep(0.05 * (2 ** attempt))  # Back off before retrying throttled keys
+            
+            if request_items:
+                unprocessed = len(request_items[table_name]['Keys'])
+                raise UnprocessedKeysError(f'{unprocessed} keys of {table_name} still unprocessed after {attempts} attempts')
+        
+        return items
+    
+    def _batch_get_user_items(self, user_ids, attempts=5, consistent=False):
+        """Fetch raw user items by id; returns user_id -> item for the users that exist"""
+        keys = [{'id': user_id} for user_id in dict.fromkeys(user_ids)]
+        return self._batch_get_items(self.users_table_name, keys, attempts, consistent)
+    
+    def get_users(self, user_ids):
+        """
+        Get several users by ID, ceil(N/100) BatchGetItem round trips
+        
+        Returns:
+            dict: user_id -> user for the users that exist
+        
+        Raises:
+            UnprocessedKeysError: if some users could not be read; other
+                DynamoDB errors propagate too, so callers never mistake a
+                failed read for users that do not exist
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        users = self.cache.get_many('user', user_ids)
+        missing = [user_id for user_id in user_ids if user_id not in users]
+        
+        if missing:
+            for user_id, item in self._batch_get_user_items(missing).items():
+                users[user_id] = self._clean_user(item)
+                self.cache.set('user', user_id, users[user_id])
+        return users
+    
+    def scan_all(self, table, **kwargs):
+        """Stream every item of a table with a parallel segment scan"""
+        return parallel_scan(
+            table,
+            total_segments=self.scan_segments,
+            max_workers=self.scan_workers,
+            **kwargs
+        )
+    
     def get_all_users(self):
         """Get all users"""
         try:
-            response = self.users_table.scan()
-            users = response['Items']
+            users = list(self.scan_all(self.users_table))
             
             # Convert Decimal to float and sort by elo_rating
             for user in users:
-                user['elo_rating'] = float(user['elo_rating'])
+                self._clean_user(user)
             
             # Sort by elo_rating in descending order
             users.sort(key=lambda x: x['elo_rating'], reverse=True)
@@ -255,14 +267,349 @@ class Database:
             print(f"Error getting all users: {e}")
             return []
     
+    def list_users(self, limit=50, cursor=None):
+        """
+        Get one page of users ordered by Elo rating (highest first)
+        
+        Returns:
+            tuple: (users, next_cursor) - next_cursor is None on the last page
+        
+        Raises:
+            ValueError: if the cursor is malformed
+        """
+        items, next_cursor = fetch_page(
+            self.users_table.query,
+            limit,
+            cursor,
+            IndexName='elo-index',
+            KeyConditionExpression=Key('leaderboard_pk').eq(LEADERBOARD_PARTITION),
+            ScanIndexForward=False
+        )
+        return [self._clean_user(item) for item in items], next_cursor
+    
+    def _ensure_global_stats(self):
+        """Create the global stats item the first time it is needed"""
+        if self._global_stats_ready:
+            return
+        try:
+            self.stats_table.put_item(
+                Item={
+                    'id': GLOBAL_STATS_ID,
+                    'user_count': 0,
+                    'elo_sum': Decimal('0'),
+                    'histogram': {}
+                },
+                ConditionExpression='attribute_not_exists(id)'
+            )
+        except self.dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            pass  # Already exists
+        self._global_stats_ready = True
+    
+    def _record_elo_changes(self, changes):
+        """
+        Apply Elo changes to the global stats item in one update
+        
+        Args:
+            changes: (old_rating, new_rating) pairs; old_rating None means a new user
+        """
+        histogram = EloHistogram()
+        new_users = 0
+        elo_delta = Decimal('0')
+        bucket_deltas = {}
+        
+        for old_rating, new_rating in changes:
+            new_rating = Decimal(str(new_rating))
+            if old_rating is None:
+                new_users += 1
+            else:
+                old_rating = Decimal(str(old_rating))
+                elo_delta -= old_rating
+                old_key = histogram.bucket_key(old_rating)
+                bucket_deltas[old_key] = bucket_deltas.get(old_key, 0) - 1
+            elo_delta += new_rating
+            new_key = histogram.bucket_key(new_rating)
+            bucket_deltas[new_key] = bucket_deltas.get(new_key, 0) + 1
+        
+        try:
+            self._apply_global_stats_deltas(new_users, elo_delta, bucket_deltas)
+        except Exception as e:
+            with self._stats_failures_lock:
+                self._stats_failures += 1
+                self._last_stats_failure = datetime.utcnow().isoformat()
+            print(f"Error updating global stats (drift until repair_global_stats runs): {e}")
+        
+        # Leaderboard pages and stats are stale for every worker now
+        self.cache.bump('elo')
+    
+    def _apply_global_stats_deltas(self, new_users, elo_delta, bucket_deltas, buckets_per_update=50):
+        """
+        ADD deltas to the global stats item's user count, Elo sum and histogram
+        buckets. Large histogram changes are split across several updates to
+        stay under the expression size limit; every update is a relative ADD,
+        so none overwrites a concurrent one.
+        """
+        self._ensure_global_stats()
+        bucket_deltas = [(key, delta) for key, delta in bucket_deltas.items() if delta]
+        
+        start = 0
+        while True:
+            chunk = bucket_deltas[start:start + buckets_per_update]
+            update_expression = 'ADD elo_sum :elo_delta, user_count :new_users'
+            names = {}
+            values = {':elo_delta': elo_delta, ':new_users': new_users}
+            if chunk:
+                assignments = []
+                for i, (key, delta) in enumerate(chunk):
+                    names[f'#b{i}'] = key
+                    values[f':d{i}'] = delta
+                    assignments.append(f'histogram.#b{i} = if_not_exists(histogram.#b{i}, :zero) + :d{i}')
+                values[':zero'] = 0
+                update_expression = 'SET ' + ', '.join(assignments) + ' ' + update_expression
+            
+            update_kwargs = {
+                'Key': {'id': GLOBAL_STATS_ID},
+                'UpdateExpression': update_expression,
+                'ExpressionAttributeValues': values
+            }
+            if names:
+                update_kwargs['ExpressionAttributeNames'] = names
+            self.stats_table.update_item(**update_kwargs)
+            
+            # The totals go with the first update only
+            new_users, elo_delta = 0, Decimal('0')
+            start += buckets_per_update
+            if start >= len(bucket_deltas):
+                break
+    
+    @property
+    def global_stats_health(self):
+        """Failed global stats updates in this process since it started"""
+        with self._stats_failures_lock:
+            return {
+                'update_failures': self._stats_failures,
+                'last_failure': self._last_stats_failure
+            }
+    
+    def repair_global_stats(self):
+        """
+        Correct the global stats item from a users-table scan while the app is
+        serving: the difference between the scan and the item is applied with
+        ADD (see _apply_global_stats_deltas), so concurrent rating updates are
+        kept, unlike `setup_dynamodb.py rebuild-stats`. Ratings applied during
+        the scan may leave a small residue; running it again shrinks it.
+        
+        Returns:
+            dict with the user_count, elo_sum and bucket corrections applied
+        """
+        histogram = EloHistogram()
+        user_count = 0
+        elo_sum = Decimal('0')
+        counts = {}
+        for item in self.scan_all(self.users_table, ProjectionExpression='elo_rating'):
+            user_count += 1
+            elo_sum += item['elo_rating']
+            key = histogram.bucket_key(item['elo_rating'])
+            counts[key] = counts.get(key, 0) + 1
+        
+        self._ensure_global_stats()
+        current = self.stats_table.get_item(Key={'id': GLOBAL_STATS_ID}, ConsistentRead=True).get('Item', {})
+        stored_counts = current.get('histogram', {})
+        bucket_deltas = {
+            key: counts.get(key, 0) - int(stored_counts.get(key, 0))
+            for key in set(counts) | set(stored_counts)
+        }
+        user_delta = user_count - int(current.get('user_count', 0))
+        elo_delta = elo_sum - Decimal(str(current.get('elo_sum', 0)))
+        
+        self._apply_global_stats_deltas(user_delta, elo_delta, bucket_deltas)
+        self.cache.bump('elo')
+        return {
+            'user_count': user_delta,
+            'elo_sum': float(elo_delta),
+            'buckets': sum(1 for delta in bucket_deltas.values() if delta)
+        }
+    
+    def get_global_stats(self):
+        """
+        Get app-wide counters from the global stats item
+        
+        Returns:
+            dict with user_count, elo_sum and histogram (an EloHistogram)
+        """
+        scope = self.cache.scope('elo')
+        item = self.cache.get('stats', GLOBAL_STATS_ID, scope=scope)
+        if item is None:
+            response = self.stats_table.get_item(Key={'id': GLOBAL_STATS_ID})
+            item = response.get('Item', {})
+            self.cache.set('stats', GLOBAL_STATS_ID, item, scope=scope)
+        return {
+            'user_count': int(item.get('user_count', 0)),
+            'elo_sum': float(item.get('elo_sum', 0)),
+            'histogram': EloHistogram(item.get('histogram', {}))
+        }
+    
+    def get_leaderboard(self, limit=50, cursor=None):
+        """
+        Get one page of users ordered by Elo rating (highest first)
+        
+        Reads the elo-index GSI, so the cost is proportional to the page size
+        rather than the number of users. Ranks continue across pages because
+        the cursor carries the rank of the last user returned.
+        
+        Returns:
+            tuple: (users, next_cursor) - next_cursor is None on the last page
+        
+        Raises:
+            ValueError: if the cursor is malformed
+        """
+        scope = self.cache.scope('elo')
+        cache_key = f'{limit}:{cursor or ""}'
+        cached = self.cache.get('leaderboard', cache_key, scope=scope)
+        if cached is not None:
+            return cached['users'], cached['next_cursor']
+        
+        start_key, state = decode_cursor(cursor)
+        rank_offset = int(state.get('rank', 0))
+        
+        query_kwargs = {
+            'IndexName': 'elo-index',
+            'KeyConditionExpression': Key('leaderboard_pk').eq(LEADERBOARD_PARTITION),
+            'ScanIndexForward': False,  # Highest Elo first
+            'Limit': limit
+        }
+        if start_key:
+            query_kwargs['ExclusiveStartKey'] = start_key
+        
+        response = self.users_table.query(**query_kwargs)
+        
+        users = []
+        for i, item in enumerate(response.get('Items', [])):
+            user = self._clean_user(item)
+            user['rank'] = rank_offset + i + 1
+            users.append(user)
+        
+        next_cursor = None
+        if 'LastEvaluatedKey' in response:
+            next_cursor = encode_cursor(
+                response['LastEvaluatedKey'],
+                rank=rank_offset + len(users)
+            )
+        
+        self.cache.set('leaderboard', cache_key, {'users': users, 'next_cursor': next_cursor}, scope=scope)
+        return users, next_cursor
+    
+    def reconcile_leaderboard(self, blocking=False):
+        """
+        Rebuild the in-process rank index from the users table. With blocking,
+        wait for a reconcile already running in another thread instead of
+        returning at once (and skip the scan if that one loaded the index).
+        """
+        if not self._reconcile_lock.acquire(blocking=blocking):
+            return  # Another thread is already reconciling
+        
+        try:
+            if blocking and not self.ranked_leaderboard.needs_reconcile():
+                return
+            self.ranked_leaderboard.begin_reconcile()
+            entries = [
+                (item['id'], item['elo_rating'])
+                for item in self.scan_all(self.users_table, ProjectionExpression='id, elo_rating')
+            ]
+            self.ranked_leaderboard.finish_reconcile(entries)
+        except Exception as e:
+            self.ranked_leaderboard.abort_reconcile()
+            print(f"Error reconciling leaderboard: {e}")
+        finally:
+            self._reconcile_lock.release()
+    
+    def _ensure_ranked_leaderboard(self):
+        """
+        Load the rank index on first use and refresh it in the background when stale
+        
+        Every thread waits for the first load, since until then the index only
+        holds the users written by this worker.
+        
+        Raises:
+            LeaderboardUnavailableError: if the index could not be loaded
+        """
+        if not self.ranked_leaderboard.needs_reconcile():
+            return
+        
+        if self.ranked_leaderboard.last_reconciled is None:
+            self.reconcile_leaderboard(blocking=True)
+            if self.ranked_leaderboard.last_reconciled is None:
+                raise LeaderboardUnavailableError('Leaderboard is not available yet, please retry')
+        else:
+            threading.Thread(target=self.reconcile_leaderboard, daemon=True).start()
+    
+    def get_user_rank(self, user_id):
+        """
+        Get a user's leaderboard position from the in-process rank index
+        
+        Returns:
+            dict with rank and total_users, or None if the user is not ranked
+        
+        Raises:
+            LeaderboardUnavailableError: if the rank index could not be loaded
+        """
+        self._ensure_ranked_leaderboard()
+        rank = self.ranked_leaderboard.rank(user_id)
+        if rank is None:
+            return None
+        return {
+            'rank': rank,
+            'total_users': len(self.ranked_leaderboard)
+        }
+    
+    def get_ranked_entries(self):
+        """
+        Get every (user_id, elo_rating) pair known to the in-process rank index
+        
+        Raises:
+            LeaderboardUnavailableError: if the rank index could not be loaded
+        """
+        self._ensure_ranked_leaderboard()
+        return self.ranked_leaderboard.items()
+    
+    def get_top_ranked(self, limit=10, offset=0):
+        """
+        Get the users ranked offset+1 .. offset+limit from the in-process rank
+        index, highest Elo first, each with its rank. Unlike get_leaderboard,
+        any offset is reached in O(log n) without walking earlier pages.
+        
+        Raises:
+            LeaderboardUnavailableError: if the rank index could not be loaded
+        """
+        self._ensure_ranked_leaderboard()
+        entries = self.ranked_leaderboard.top(limit, offset)
+        users = self.get_users([user_id for user_id, _ in entries])
+        
+        ranked = []
+        for position, (user_id, _) in enumerate(entries):
+            user = users.get(user_id)
+            if user is None:
+                continue  # Not readable any more; dropped at the next reconcile
+            user['rank'] = offset + position + 1
+            ranked.append(user)
+        return ranked
+    
     def update_elo_rating(self, user_id, new_rating):
         """Update user's Elo rating"""
         try:
-            self.users_table.update_item(
+            response = self.users_table.update_item(
                 Key={'id': user_id},
-                UpdateExpression='SET elo_rating = :rating',
-                ExpressionAttributeValues={':rating': Decimal(str(new_rating))}
+                UpdateExpression='SET elo_rating = :rating ADD version :one',
+                ExpressionAttributeValues={
+                    ':rating': Decimal(str(new_rating)),
+                    ':one': 1
+                },
+                ReturnValues='UPDATED_OLD'
             )
+            self.cache.invalidate('user', user_id)
+            self.ranked_leaderboard.update(user_id, new_rating)
+            old_rating = response.get('Attributes', {}).get('elo_rating')
+            if old_rating is not None:
+                self._record_elo_changes([(old_rating, new_rating)])
         except Exception as e:
             print(f"Error updating elo rating: {e}")
     
@@ -281,43 +628,430 @@ class Database:
         
         try:
             self.ratings_table.put_item(Item=item)
-            return rating_id
+            self.ratings_table.put_item(Item=self._rating_pair_item(item))
         except Exception as e:
             print(f"Error adding rating: {e}")
             return None
+        
+        self.add_to_seen_filter(rater_id, rated_id)
+        self._add_rating_aggregates(rater_id, rated_id, rating, is_match)
+        return rating_id
+    
+    def _aggregate_increments(self, side, rating, is_match):
+        """ADD operands for one rating, side being 'given' or 'received'"""
+        return {
+            f'ratings_{side}_count': 1,
+            f'ratings_{side}_sum': rating,
+            f'matches_{side}_count': 1 if is_match else 0
+        }
+    
+    def _zero_aggregates(self, side):
+        """Empty running totals to accumulate several ratings' increments into"""
+        return {
+            f'ratings_{side}_count': 0,
+            f'ratings_{side}_sum': 0,
+            f'matches_{side}_count': 0
+        }
+    
+    def _add_rating_aggregates(self, rater_id, rated_id, rating, is_match):
+        """Bump both users' running aggregates for a rating written outside record_rating"""
+        try:
+            for user_id, side in ((rater_id, 'given'), (rated_id, 'received')):
+                increments = self._aggregate_increments(side, rating, is_match)
+                self.users_table.update_item(
+                    Key={'id': user_id},
+                    UpdateExpression='ADD ' + ', '.join(f'{name} :{name}' for name in increments),
+                    ExpressionAttributeValues={f':{name}': value for name, value in increments.items()}
+                )
+        except Exception as e:
+            print(f"Error updating rating aggregates: {e}")
+    
+    def _rating_pair_item(self, rating_item):
+        """Build the pair item for a rating record"""
+        return {
+            'id': rating_pair_key(rating_item['rater_id'], rating_item['rated_id']),
+            'rating_id': rating_item['id'],
+            'is_match': rating_item['is_match'],
+            'created_at': rating_item['created_at']
+        }
+    
+    def _seen_filter_with(self, user_item, rated_id):
+        """Return the user's seen filter (rebuilt if missing or saturated) with rated_id added"""
+        stored = user_item.get('seen_filter')
+        seen_filter = None
+        if stored is not None:
+            raw = stored.value if hasattr(stored, 'value') else bytes(stored)
+            seen_filter = BloomFilter.from_bytes(raw)
+        if seen_filter is None or seen_filter.is_saturated:
+            seen_filter = self._build_seen_filter(user_item['id'])
+        seen_filter.add(rated_id)
+        return seen_filter
+    
+    def _versioned_user_update(self, user_item, set_values, add_values=None):
+        """
+        Build a TransactWriteItems Update that only applies if the user is
+        unchanged since it was read
+        
+        Args:
+            set_values: {attribute: value} to SET
+            add_values: {attribute: number} to ADD (version is always bumped)
+        """
+        add_values = dict(add_values or {}, version=1)
+        values = {}
+        for name, value in set_values.items():
+            values[f':set_{name}'] = value
+        for name, value in add_values.items():
+            values[f':add_{name}'] = value
+        
+        update_expression = 'SET ' + ', '.join(f'{name} = :set_{name}' for name in set_values)
+        update_expression += ' ADD ' + ', '.join(f'{name} :add_{name}' for name in add_values)
+        
+        if 'version' in user_item:
+            condition = 'version = :version'
+            values[':version'] = user_item['version']
+        else:
+            # Users created before versioning was introduced
+            condition = 'attribute_exists(id) AND attribute_not_exists(version)'
+        
+        return {
+            'Update': {
+                'TableName': self.users_table_name,
+                'Key': {'id': user_item['id']},
+                'UpdateExpression': update_expression,
+                'ConditionExpression': condition,
+                'ExpressionAttributeValues': values
+            }
+        }
+    
+    def record_rating(self, rater_id, rated_id, rating, is_match, calculate_new_ratings, max_attempts=5, log_queue=None):
+        """
+        Apply a rating atomically: both users' new Elo ratings and rating
+        aggregates, the rater's seen filter, the rating record and its pair
+        item are written in one TransactWriteItems call, conditioned on neither
+        user having changed since they were read.
+        On a lost race the users are re-read and the Elo recomputed.
+        
+        Args:
+            calculate_new_ratings: Callable (rater_elo, rated_elo, rating, is_match)
+                -> (new_rater_elo, new_rated_elo), e.g. EloSystem.calculate_new_ratings
+            log_queue: Optional WriteBehindQueue; if given, only the user updates
+                are transactional and the rating record is submitted to the queue
+                (see persist_rating_logs) once they commit
+        
+        Returns:
+            dict with rating_id, rater, rated (pre-rating user items as returned by
+            get_user), new_rater_rating and new_rated_rating; None if either user
+            does not exist
+        
+        Raises:
+            RatingConflictError: if every attempt lost a concurrent update
+        """
+        client = self.dynamodb.meta.client
+        
+        for attempt in range(max_attempts):
+            items = self._batch_get_user_items([rater_id, rated_id], consistent=True)
+            if rater_id not in items or rated_id not in items:
+                return None
+            rater_item = items[rater_id]
+            rated_item = items[rated_id]
+            
+            new_rater_rating, new_rated_rating = calculate_new_ratings(
+                float(rater_item['elo_rating']),
+                float(rated_item['elo_rating']),
+                rating,
+                is_match
+            )
+            seen_filter = self._seen_filter_with(rater_item, rated_id)
+            
+            rating_id = str(uuid.uuid4())
+            rating_item = {
+                'id': rating_id,
+                'rater_id': rater_id,
+                'rated_id': rated_id,
+                'rating': rating,
+                'is_match': is_match,
+                'created_at': datetime.utcnow().isoformat()
+            }
+            
+            transact_items = [
+                self._versioned_user_update(
+                    rater_item,
+                    {
+                        'elo_rating': Decimal(str(new_rater_rating)),
+                        'seen_filter': seen_filter.to_bytes()
+                    },
+                    self._aggregate_increments('given', rating, is_match)
+                ),
+                self._versioned_user_update(
+                    rated_item,
+                    {'elo_rating': Decimal(str(new_rated_rating))},
+                    self._aggregate_increments('received', rating, is_match)
+                )
+            ]
+            if log_queue is None:
+                transact_items += [
+                    {
+                        'Put': {
+                            'TableName': self.ratings_table_name,
+                            'Item': rating_item,
+                            'ConditionExpression': 'attribute_not_exists(id)'
+                        }
+                    },
+                    {
+                        'Put': {
+                            'TableName': self.ratings_table_name,
+                            'Item': self._rating_pair_item(rating_item)
+                        }
+                    }
+                ]
+            
+            try:
+                client.transact_write_items(TransactItems=transact_items)
+            except client.exceptions.TransactionCanceledException as e:
+                if not self._lost_race(e):
+                    raise
+                # Someone else updated one of the users; back off and recompute
+                time.sleep(random.uniform(0, 0.02 * (2 ** attempt)))
+                continue
+            
+            self.cache.invalidate('user', rater_id, rated_id)
+            if log_queue is not None:
+                log_queue.submit(rating_item)
+            
+            self.ranked_leaderboard.update(rater_id, new_rater_rating)
+            self.ranked_leaderboard.update(rated_id, new_rated_rating)
+            self._record_elo_changes([
+                (rater_item['elo_rating'], new_rater_rating),
+                (rated_item['elo_rating'], new_rated_rating)
+            ])
+            
+            return {
+                'rating_id': rating_id,
+                'rater': self._clean_user(rater_item),
+                'rated': self._clean_user(rated_item),
+                'new_rater_rating': new_rater_rating,
+                'new_rated_rating': new_rated_rating
+            }
+        
+        raise RatingConflictError('Rating could not be applied due to concurrent updates, please retry')
+    
+    def record_ratings(self, rater_id, ratings, calculate_new_ratings, max_attempts=5, log_queue=None):
+        """
+        Apply an ordered batch of ratings from one rater
+        
+        Elo is applied sequentially in memory, so each rating sees the rater's
+        Elo after the previous one. All affected users (rater plus every rated
+        user, each once), the rating records and one pair item per rated user
+        (from their last rating) are written in one versioned TransactWriteItems
+        call, as in record_rating; on a lost race everything is re-read and
+        recomputed. With log_queue, only the user updates are transactional and
+        the rating records are handed to the queue.
+        
+        Args:
+            ratings: List of (rated_id, rating, is_match); the transaction holds
+                1 + len(ratings) + 2 * distinct rated users items (limit 100)
+            calculate_new_ratings: See record_rating
+        
+        Returns:
+            dict with rater (pre-batch user), new_rater_rating and results: one
+            entry per rating, in order, either {rated_id, rating_id, rater_rating,
+            rated_rating, rated_rating_before, match_id} or {rated_id, error};
+            None if the rater does not exist
+        
+        Raises:
+            RatingConflictError: if every attempt lost a concurrent update
+        """
+        client = self.dynamodb.meta.client
+        rated_ids = list(dict.fromkeys(rated_id for rated_id, _, _ in ratings))
+        
+        for attempt in range(max_attempts):
+            items = self._batch_get_user_items([rater_id] + rated_ids, consistent=True)
+            if rater_id not in items:
+                return None
+            rater_item = items[rater_id]
+            
+            elo = {user_id: float(item['elo_rating']) for user_id, item in items.items()}
+            given = self._zero_aggregates('given')
+            received = {}
+            seen_filter = None
+            rating_items = []
+            results = []
+            
+            for rated_id, rating, is_match in ratings:
+                if rated_id not in items:
+                    results.append({'rated_id': rated_id, 'error': 'User not found'})
+                    continue
+                
+                rated_before = elo[rated_id]
+                elo[rater_id], elo[rated_id] = calculate_new_ratings(elo[rater_id], rated_before, rating, is_match)
+                
+                for name, value in self._aggregate_increments('given', rating, is_match).items():
+                    given[name] += value
+                rated_totals = received.setdefault(rated_id, self._zero_aggregates('received'))
+                for name, value in self._aggregate_increments('received', rating, is_match).items():
+                    rated_totals[name] += value
+                
+                if seen_filter is None:
+                    seen_filter = self._seen_filter_with(rater_item, rated_id)
+                else:
+                    seen_filter.add(rated_id)
+                
+                rating_item = {
+                    'id': str(uuid.uuid4()),
+                    'rater_id': rater_id,
+                    'rated_id': rated_id,
+                    'rating': rating,
+                    'is_match': is_match,
+                    'created_at': datetime.utcnow().isoformat()
+                }
+                rating_items.append(rating_item)
+                results.append({
+                    'rated_id': rated_id,
+                    'rating_id': rating_item['id'],
+                    'rater_rating': elo[rater_id],
+                    'rated_rating': elo[rated_id],
+                    'rated_rating_before': rated_before,
+                    'match_id': None
+                })
+            
+            if not rating_items:
+                return {'rater': self._clean_user(rater_item), 'new_rater_rating': elo[rater_id], 'results': results}
+            
+            transact_items = [
+                self._versioned_user_update(
+                    rater_item,
+                    {
+                        'elo_rating': Decimal(str(elo[rater_id])),
+                        'seen_filter': seen_filter.to_bytes()
+                    },
+                    given
+                )
+            ]
+            for rated_id, increments in received.items():
+                transact_items.append(self._versioned_user_update(
+                    items[rated_id],
+                    {'elo_rating': Decimal(str(elo[rated_id]))},
+                    increments
+                ))
+            if log_queue is None:
+                # A transaction may touch each item once, so a user rated twice
+                # gets the pair item of their last rating (batch_writer's result)
+                pair_items = {item['rated_id']: self._rating_pair_item(item) for item in rating_items}
+                transact_items += [
+                    {
+                        'Put': {
+                            'TableName': self.ratings_table_name,
+                            'Item': rating_item,
+                            'ConditionExpression': 'attribute_not_exists(id)'
+                        }
+                    }
+                    for rating_item in rating_items
+                ]
+                transact_items += [
+                    {'Put': {'TableName': self.ratings_table_name, 'Item': pair_item}}
+                    for pair_item in pair_items.values()
+                ]
+            
+            try:
+                client.transact_write_items(TransactItems=transact_items)
+            except client.exceptions.TransactionCanceledException as e:
+                if not self._lost_race(e):
+                    raise
+                time.sleep(random.uniform(0, 0.02 * (2 ** attempt)))
+                continue
+            
+            self.cache.invalidate('user', rater_id, *received)
+            if log_queue is not None:
+                for rating_item in rating_items:
+                    log_queue.submit(rating_item)
+            else:
+                match_ids = self._create_mutual_matches(rating_items)
+                for result in results:
+                    result['match_id'] = match_ids.get(result.get('rating_id'))
+            
+            changes = []
+            for user_id in [rater_id] + list(received):
+                self.ranked_leaderboard.update(user_id, elo[user_id])
+                changes.append((items[user_id]['elo_rating'], elo[user_id]))
+            self._record_elo_changes(changes)
+            
+            return {'rater': self._clean_user(rater_item), 'new_rater_rating': elo[rater_id], 'results': results}
+        
+        raise RatingConflictError('Ratings could not be applied due to concurrent updates, please retry')
+    
+    def _lost_race(self, error):
+        """Whether a cancelled transaction failed only because a user changed since it was read"""
+        reasons = [reason.get('Code') for reason in error.response.get('CancellationReasons', [])]
+        return any(code in ('ConditionalCheckFailed', 'TransactionConflict') for code in reasons)
+    
+    def persist_rating_logs(self, rating_items):
+        """
+        Write rating records and their pair items with batch_writer, then create
+        matches for likes that are now mutual. Also the write-behind handler for
+        record_rating(log_queue=...).
+        
+        Returns:
+            dict: {rating_id: match_id} for the ratings that completed a match
+        """
+        with self.ratings_table.batch_writer(overwrite_by_pkeys=['id']) as batch:
+            for rating_item in rating_items:
+                batch.put_item(Item=rating_item)
+                batch.put_item(Item=self._rating_pair_item(rating_item))
+        
+        return self._create_mutual_matches(rating_items)
+    
+    def _create_mutual_matches(self, rating_items):
+        """
+        Create matches for the likes among already written rating records whose
+        reverse like exists
+        
+        Returns:
+            dict: {rating_id: match_id} for the ratings that completed a match
+        """
+        likes = [item for item in rating_items if item['is_match']]
+        if not likes:
+            return {}
+        
+        # The likes themselves were just written, so only the reverse pairs are needed
+        pairs = self._get_rating_pairs(list({(item['rated_id'], item['rater_id']) for item in likes}))
+        match_ids = {}
+        for item in likes:
+            if pairs.get(rating_pair_key(item['rated_id'], item['rater_id']), {}).get('is_match'):
+                match_ids[item['id']] = self.create_match(item['rater_id'], item['rated_id'])
+        return match_ids
+    
+    def _get_rating_pairs(self, pairs):
+        """Fetch pair items for (rater_id, rated_id) tuples with consistent BatchGetItem calls"""
+        keys = [{'id': rating_pair_key(rater_id, rated_id)} for rater_id, rated_id in pairs]
+        return self._batch_get_items(self.ratings_table_name, keys, consistent=True)
     
     def check_mutual_match(self, user1_id, user2_id):
         """Check if two users have mutually liked each other"""
         try:
-            # Check if user1 liked user2
-            response1 = self.ratings_table.query(
-                IndexName='rater-index',
-                KeyConditionExpression=Key('rater_id').eq(user1_id),
-                FilterExpression=Attr('rated_id').eq(user2_id) & Attr('is_match').eq(True)
-            )
-            user1_liked = len(response1['Items']) > 0
+            pairs = self._get_rating_pairs([(user1_id, user2_id), (user2_id, user1_id)])
             
-            # Check if user2 liked user1
-            response2 = self.ratings_table.query(
-                IndexName='rater-index',
-                KeyConditionExpression=Key('rater_id').eq(user2_id),
-                FilterExpression=Attr('rated_id').eq(user1_id) & Attr('is_match').eq(True)
-            )
-            user2_liked = len(response2['Items']) > 0
+            user1_liked = pairs.get(rating_pair_key(user1_id, user2_id), {}).get('is_match', False)
+            user2_liked = pairs.get(rating_pair_key(user2_id, user1_id), {}).get('is_match', False)
             
-            return user1_liked and user2_liked
+            return bool(user1_liked and user2_liked)
         except Exception as e:
             print(f"Error checking mutual match: {e}")
             return False
     
     def create_match(self, user1_id, user2_id):
-        """Create a match between two users"""
-        match_id = str(uuid.uuid4())
+        """
+        Create a match between two users
         
+        The match ID is derived from the ordered user pair and the write is
+        conditional, so creating the same match twice (e.g. from two concurrent
+        likes) leaves a single item and returns the same ID.
+        """
         # Ensure consistent ordering for the match
         if user1_id > user2_id:
             user1_id, user2_id = user2_id, user1_id
         
+        match_id = match_key(user1_id, user2_id)
+        
         item = {
             'id': match_id,
             'user1_id': user1_id,
@@ -326,133 +1060,275 @@ class Database:
         }
         
         try:
-            # Check if match already exists by scanning for the pair
-            existing_matches = self.matches_table.scan(
-                FilterExpression=Attr('user1_id').eq(user1_id) & Attr('user2_id').eq(user2_id)
+            self.matches_table.put_item(
+                Item=item,
+                ConditionExpression='attribute_not_exists(id)'
             )
-            
-            if len(existing_matches['Items']) == 0:
-                self.matches_table.put_item(Item=item)
-            
+            return match_id
+        except self.dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            # Match already exists
             return match_id
         except Exception as e:
             print(f"Error creating match: {e}")
             return None
     
-    def get_users_to_rate(self, user_id):
-        """Get users that haven't been rated by the current user"""
+    def query_elo_range(self, low=None, high=None, descending=False, limit=50, start_key=None):
+        """
+        Get one page of users whose Elo lies in [low, high] from the elo-index GSI
+        
+        Args:
+            low / high: Inclusive Elo bounds (None leaves that side open)
+            descending: Walk from high to low Elo instead of low to high
+            limit: Maximum number of users read
+            start_key: LastEvaluatedKey of the previous page
+        
+        Returns:
+            tuple: (users, last_evaluated_key)
+        """
+        condition = Key('leaderboard_pk').eq(LEADERBOARD_PARTITION)
+        if low is not None and high is not None:
+            condition = condition & Key('elo_rating').between(Decimal(str(low)), Decimal(str(high)))
+        elif low is not None:
+            condition = condition & Key('elo_rating').gte(Decimal(str(low)))
+        elif high is not None:
+            condition = condition & Key('elo_rating').lte(Decimal(str(high)))
+        
+        query_kwargs = {
+            'IndexName': 'elo-index',
+            'KeyConditionExpression': condition,
+            'ScanIndexForward': not descending,
+            'Limit': limit
+        }
+        if start_key:
+            query_kwargs['ExclusiveStartKey'] = start_key
+        
         try:
-            # Get all users
-            all_users_response = self.users_table.scan()
-            all_users = all_users_response['Items']
-            
-            # Get users already rated by this user
-            rated_response = self.ratings_table.query(
-                IndexName='rater-index',
-                KeyConditionExpression=Key('rater_id').eq(user_id)
-            )
-            rated_user_ids = {item['rated_id'] for item in rated_response['Items']}
-            
-            # Filter out the current user and already rated users
-            unrated_users = [
-                user for user in all_users 
-                if user['id'] != user_id and user['id'] not in rated_user_ids
-            ]
-            
-            # Convert Decimal to float for JSON serialization
-            for user in unrated_users:
-                user['elo_rating'] = float(user['elo_rating'])
-            
-            # Sort by a mix of Elo rating and randomness for better discovery
-            import random
-            random.shuffle(unrated_users)  # Add some randomness
-            unrated_users.sort(key=lambda x: x['elo_rating'], reverse=True)
-            
-            return unrated_users
+            response = self.users_table.query(**query_kwargs)
+            users = [self._clean_user(item) for item in response.get('Items', [])]
+            return users, response.get('LastEvaluatedKey')
         except Exception as e:
-            print(f"Error getting users to rate: {e}")
-            return []
+            print(f"Error querying Elo range: {e}")
+            return [], None
     
-    def get_user_stats(self, user_id):
-        """Get detailed statistics for a user"""
+    def get_rated_user_ids(self, user_id):
+        """Get the IDs of every user the given user has already rated"""
         try:
-            # Get ratings given by this user
-            given_ratings = self.ratings_table.query(
-                IndexName='rater-index',
-                KeyConditionExpression=Key('rater_id').eq(user_id)
-            )
-            
-            # Get ratings received by this user
-            received_ratings = self.ratings_table.query(
-                IndexName='rated-index',
-                KeyConditionExpression=Key('rated_id').eq(user_id)
-            )
-            
-            # Calculate statistics
-            given_items = given_ratings['Items']
-            received_items = received_ratings['Items']
-            
-            # Matches given and received
-            matches_given = len([r for r in given_items if r['is_match']])
-            matches_received = len([r for r in received_items if r['is_match']])
-            
-            # Average ratings
-            avg_rating_given = sum(r['rating'] for r in given_items) / len(given_items) if given_items else 0
-            avg_rating_received = sum(r['rating'] for r in received_items) / len(received_items) if received_items else 0
-            
-            # Match rate (percentage of ratings that resulted in matches)
-            match_rate_given = (matches_given / len(given_items) * 100) if given_items else 0
-            match_rate_received = (matches_received / len(received_items) * 100) if received_items else 0
-            
             return {
-                'total_ratings_given': len(given_items),
-                'total_ratings_received': len(received_items),
-                'matches_given': matches_given,
-                'matches_received': matches_received,
-                'average_rating_given': round(avg_rating_given, 2),
-                'average_rating_received': round(avg_rating_received, 2),
-                'match_rate_given': round(match_rate_given, 2),
-                'match_rate_received': round(match_rate_received, 2)
+                item['rated_id']
+                for item in paginate(
+                    self.ratings_table.query,
+                    IndexName='rater-index',
+                    KeyConditionExpression=Key('rater_id').eq(user_id),
+                    ProjectionExpression='rated_id'
+                )
             }
         except Exception as e:
-            print(f"Error getting user stats: {e}")
-            return {}
+            print(f"Error getting rated users: {e}")
+            return set()
     
-    def get_rating_history(self, user_id, limit=50):
-        """Get rating history for a user (both given and received)"""
+    def has_rated(self, rater_id, rated_id):
+        """Exact check of whether rater_id has already rated rated_id"""
         try:
-            # Get ratings given by this user
-            given_ratings = self.ratings_table.query(
-                IndexName='rater-index',
-                KeyConditionExpression=Key('rater_id').eq(user_id),
-                Limit=limit,
-                ScanIndexForward=False  # Most recent first
+            response = self.ratings_table.get_item(
+                Key={'id': rating_pair_key(rater_id, rated_id)},
+                ProjectionExpression='id'
             )
-            
-            # Get ratings received by this user
-            received_ratings = self.ratings_table.query(
-                IndexName='rated-index',
-                KeyConditionExpression=Key('rated_id').eq(user_id),
-                Limit=limit,
-                ScanIndexForward=False  # Most recent first
+            return 'Item' in response
+        except Exception as e:
+            print(f"Error checking rating: {e}")
+            return False
+    
+    def _build_seen_filter(self, user_id):
+        """Build a right-sized seen filter from the user's full rating history"""
+        rated_user_ids = self.get_rated_user_ids(user_id)
+        seen_filter = BloomFilter(
+            capacity=max(self.seen_filter_capacity, 2 * len(rated_user_ids)),
+            error_rate=self.seen_filter_error_rate
+        )
+        for rated_id in rated_user_ids:
+            seen_filter.add(rated_id)
+        return seen_filter
+    
+    def _load_seen_filter(self, user_id):
+        """Read the stored seen filter, returning (filter, raw_bytes) or (None, None)"""
+        response = self.users_table.get_item(
+            Key={'id': user_id},
+            ProjectionExpression='seen_filter'
+        )
+        stored = response.get('Item', {}).get('seen_filter')
+        if stored is None:
+            return None, None
+        raw = stored.value if hasattr(stored, 'value') else bytes(stored)
+        return BloomFilter.from_bytes(raw), raw
+    
+    def _save_seen_filter(self, user_id, seen_filter, previous_raw):
+        """
+        Store a seen filter only if nobody replaced it since it was read
+        
+        Returns:
+            bool: False if a concurrent writer got there first
+        """
+        if previous_raw is None:
+            condition = 'attribute_exists(id) AND attribute_not_exists(seen_filter)'
+            values = {':filter': seen_filter.to_bytes()}
+        else:
+            condition = 'seen_filter = :previous'
+            values = {':filter': seen_filter.to_bytes(), ':previous': previous_raw}
+        
+        try:
+            values[':one'] = 1
+            self.users_table.update_item(
+                Key={'id': user_id},
+                UpdateExpression='SET seen_filter = :filter ADD version :one',
+                ConditionExpression=condition,
+                ExpressionAttributeValues=values
             )
+            return True
+        except self.dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+    
+    def get_seen_filter(self, user_id):
+        """
+        Get the Bloom filter of users this user has already rated
+        
+        Users without a stored filter, or whose filter has outgrown its
+        capacity, get one rebuilt from the ratings table and persisted.
+        """
+        try:
+            seen_filter, raw = self._load_seen_filter(user_id)
+            if seen_filter is None or seen_filter.is_saturated:
+                seen_filter = self._build_seen_filter(user_id)
+                self._save_seen_filter(user_id, seen_filter, raw)
+            return seen_filter
+        except Exception as e:
+            print(f"Error getting seen filter: {e}")
+            return self._build_seen_filter(user_id)
+    
+    def add_to_seen_filter(self, rater_id, rated_id, attempts=3):
+        """Record rated_id in rater_id's seen filter (optimistic read-modify-write)"""
+        try:
+            for _ in range(attempts):
+                seen_filter, raw = self._load_seen_filter(rater_id)
+                if seen_filter is None or seen_filter.is_saturated:
+                    # The rebuilt filter already includes the new rating
+                    seen_filter = self._build_seen_filter(rater_id)
+                    seen_filter.add(rated_id)
+                elif not seen_filter.add(rated_id):
+                    return
+                if self._save_seen_filter(rater_id, seen_filter, raw):
+                    return
+        except Exception as e:
+            print(f"Error updating seen filter: {e}")
+    
+    def _stats_from_aggregates(self, item):
+        """Derive the user statistics from the running aggregates on a user item"""
+        stats = {}
+        for side in ('given', 'received'):
+            count = int(item.get(f'ratings_{side}_count', 0))
+            total = float(item.get(f'ratings_{side}_sum', 0))
+            matches = int(item.get(f'matches_{side}_count', 0))
             
-            # Combine and sort by timestamp
-            all_ratings = []
-            
-            for rating in given_ratings['Items']:
-                rating['type'] = 'given'
-                all_ratings.append(rating)
+            stats[f'total_ratings_{side}'] = count
+            stats[f'matches_{side}'] = matches
+            # Average rating and match rate (percentage of ratings that were matches)
+            stats[f'average_rating_{side}'] = round(total / count, 2) if count else 0
+            stats[f'match_rate_{side}'] = round(matches / count * 100, 2) if count else 0
+        return stats
+    
+    def get_user_with_stats(self, user_id):
+        """
+        Get a user and their rating statistics with a single get_item
+        
+        Returns:
+            tuple: (user, stats), or (None, None) if the user does not exist
+        """
+        response = self.users_table.get_item(Key={'id': user_id})
+        if 'Item' not in response:
+            return None, None
+        item = response['Item']
+        stats = self._stats_from_aggregates(item)
+        return self._clean_user(item), stats
+    
+    def get_user_stats(self, user_id):
+        """Get detailed statistics for a user"""
+        try:
+            _, stats = self.get_user_with_stats(user_id)
+            return stats or {}
+        except Exception as e:
+            print(f"Error getting user stats: {e}")
+            return {}
+    
+    def get_rating_history(self, user_id, limit=50, cursor=None):
+        """
+        Get one page of rating history for a user (both given and received)
+        
+        Each page holds at most `limit` ratings, taken from the heads of the
+        given and received index queries, newest head first; the cursor keeps
+        each side's position independently. The rater/rated indexes have no
+        sort key, so ratings are sorted by created_at within a page only, and
+        a later page may hold a rating newer than one already returned.
+        
+        Returns:
+            tuple: (ratings, next_cursor) - next_cursor is None on the last page
+        
+        Raises:
+            ValueError: if the cursor is malformed
+        """
+        _, state = decode_cursor(cursor)
+        if cursor and not state:
+            raise ValueError('Invalid cursor')
+        
+        sides = [
+            ('given', 'rater-index', 'rater_id'),
+            ('received', 'rated-index', 'rated_id')
+        ]
+        
+        fetched = {}
+        for side, index_name, attribute in sides:
+            # Rating keys are plain strings, so they are stored in the state directly
+            if cursor and side not in state:
+                continue  # This side was exhausted on an earlier page
             
-            for rating in received_ratings['Items']:
-                rating['type'] = 'received'
-                all_ratings.append(rating)
+            query_kwargs = {
+                'IndexName': index_name,
+                'KeyConditionExpression': Key(attribute).eq(user_id),
+                'Limit': limit
+            }
+            if state.get(side):
+                query_kwargs['ExclusiveStartKey'] = state[side]
             
-            # Sort by created_at timestamp
-            return sorted(all_ratings, key=lambda x: x['created_at'], reverse=True)[:limit]
-        except Exception as e:
-            print(f"Error getting rating history: {e}")
-            return []
+            response = self.ratings_table.query(**query_kwargs)
+            for rating in response['Items']:
+                rating['type'] = side
+            fetched[side] = (response['Items'], response.get('LastEvaluatedKey'))
+        
+        # Take a prefix of each side so every side can resume where it stopped
+        taken = {side: 0 for side in fetched}
+        page = []
+        while len(page) < limit:
+            heads = [(items[taken[side]], side) for side, (items, _) in fetched.items() if taken[side] < len(items)]
+            if not heads:
+                break
+            rating, side = max(heads, key=lambda head: head[0]['created_at'])
+            page.append(rating)
+            taken[side] += 1
+        
+        next_state = {}
+        for side, index_name, attribute in sides:
+            if side not in fetched:
+                continue
+            items, last_key = fetched[side]
+            if taken[side] < len(items):
+                if taken[side]:
+                    last = items[taken[side] - 1]
+                    next_state[side] = {'id': last['id'], attribute: user_id}
+                else:
+                    next_state[side] = state.get(side)  # Nothing shown yet; retry from the same place
+            elif last_key:
+                next_state[side] = last_key
+        
+        page.sort(key=lambda x: x['created_at'], reverse=True)
+        return page, encode_cursor(None, **next_state)
 
     # Photo management methods
     def create_photo(self, user_id, photo_url, is_main=False):
@@ -477,12 +1353,11 @@ class Database:
     def get_user_photos(self, user_id):
         """Get all photos for a user"""
         try:
-            response = self.photos_table.query(
+            photos = list(paginate(
+                self.photos_table.query,
                 IndexName='user-photos-index',
                 KeyConditionExpression=Key('user_id').eq(user_id)
-            )
-            
-            photos = response.get('Items', [])
+            ))
             # Sort photos with main photo first
             return sorted(photos, key=lambda x: (not x.get('is_main', False), x.get('created_at', '')))
         except Exception as e:
@@ -538,32 +1413,41 @@ class Database:
             print(f"Error getting main photo: {e}")
             return None
     
-    def get_matches_for_user(self, user_id):
-        """Get all matches for a user"""
-        try:
-            # Get matches where this user is user1
-            response = self.matches_table.query(
-                IndexName='user1-index',
-                KeyConditionExpression=Key('user1_id').eq(user_id)
-            )
-            
-            matches = response.get('Items', [])
-            
-            # Also scan for matches where this user is user2 (less efficient but necessary)
-            scan_response = self.matches_table.scan(
-                FilterExpression=Attr('user2_id').eq(user_id)
-            )
-            
-            matches.extend(scan_response.get('Items', []))
+    def get_matches_for_user(self, user_id, limit=50, cursor=None):
+        """
+        Get one page of a user's matches
+        
+        Matches where the user is user1 are read from user1-index, then those
+        where they are user2 from user2-index; the cursor records which index
+        the next page continues from.
+        
+        Returns:
+            tuple: (matches, next_cursor) - next_cursor is None on the last page
+        
+        Raises:
+            ValueError: if the cursor is malformed
+        """
+        start_key, state = decode_cursor(cursor)
+        side = state.get('side', 'user1')
+        if side not in ('user1', 'user2'):
+            raise ValueError('Invalid cursor')
+        
+        matches = []
+        while side and len(matches) < limit:
+            query_kwargs = {
+                'IndexName': f'{side}-index',
+                'KeyConditionExpression': Key(f'{side}_id').eq(user_id),
+                'Limit': limit - len(matches)
+            }
+            if start_key:
+                query_kwargs['ExclusiveStartKey'] = start_key
             
-            # Remove duplicates
-            unique_matches = {}
-            for match in matches:
-                match_id = match.get('id')
-                if match_id not in unique_matches:
-                    unique_matches[match_id] = match
+            response = self.matches_table.query(**query_kwargs)
+            matches.extend(response.get('Items', []))
             
-            return list(unique_matches.values())
-        except Exception as e:
-            print(f"Error getting matches for user: {e}")
-            return []
+            start_key = response.get('LastEvaluatedKey')
+            if not start_key:
+                side = 'user2' if side == 'user1' else None
+        
+        next_cursor = encode_cursor(start_key, side=side) if side else None
+        return matches, next_cursor
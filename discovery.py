@@ -0,0 +1,235 @@
+import os
+import random
+import threading
+import time
+
+from database import LeaderboardUnavailableError
+
+
+def parse_band_weights(value):
+    """Parse DISCOVERY_BAND_WEIGHTS, e.g. "0:4,1:2,-1:2" -> {0: 4.0, 1: 2.0, -1: 2.0}"""
+    if not value:
+        return None
+    weights = {}
+    for pair in value.split(','):
+        offset, weight = pair.split(':')
+        weights[int(offset)] = float(weight)
+    return weights
+
+
+class EloBandSampler:
+    """
+    Weighted random sampling of users from Elo bands around a rating
+
+    Users are grouped into fixed-width Elo bands that are rebuilt periodically
+    from the in-process rank index. Picking k users is O(k): choose a band by
+    weight, then a member of that band uniformly, instead of sorting everyone.
+    By default a band's weight is how evenly matched it is with the requester
+    according to EloSystem.expected_score.
+    """
+
+    def __init__(self, elo, band_width=None, max_band_offset=None, band_weights=None, refresh_interval=None):
+        """
+        elo: EloSystem used to weight bands
+        band_width: Width of one band in Elo points
+        max_band_offset: How many bands above/below the requester's band to draw from
+        band_weights: Optional {band offset: weight} overriding the Elo-based default
+        refresh_interval: Seconds between band rebuilds
+        """
+        self.elo = elo
+        self.band_width = band_width or float(os.getenv('DISCOVERY_BAND_WIDTH', '100'))
+        self.max_band_offset = max_band_offset or int(os.getenv('DISCOVERY_MAX_BAND_OFFSET', '5'))
+        self.band_weights = band_weights or parse_band_weights(os.getenv('DISCOVERY_BAND_WEIGHTS'))
+        self.refresh_interval = refresh_interval or float(os.getenv('DISCOVERY_BAND_REFRESH_SECONDS', '60'))
+
+        self._lock = threading.Lock()
+        self._bands = {}
+        self.last_rebuilt = None
+
+    def band_of(self, rating):
+        return int(rating // self.band_width)
+
+    def needs_rebuild(self):
+        if self.last_rebuilt is None:
+            return True
+        return time.monotonic() - self.last_rebuilt >= self.refresh_interval
+
+    def rebuild(self, entries):
+        """Regroup (user_id, rating) pairs into bands"""
+        bands = {}
+        for user_id, rating in entries:
+            bands.setdefault(self.band_of(rating), []).append(user_id)
+        with self._lock:
+            self._bands = bands
+            self.last_rebuilt = time.monotonic()
+
+    def __len__(self):
+        return sum(len(members) for members in self._bands.values())
+
+    def _band_weight(self, rating, offset):
+        if self.band_weights is not None:
+            return self.band_weights.get(offset, 0.0)
+        # 4 * E * (1 - E) peaks at 1.0 for an even match and falls off with the gap
+        band_center = (self.band_of(rating) + offset + 0.5) * self.band_width
+        expected = self.elo.expected_score(rating, band_center)
+        return 4 * expected * (1 - expected)
+
+    def sample(self, rating, k, exclude=None, max_attempts=None):
+        """
+        Draw up to k distinct user IDs near `rating`
+
+        exclude: Optional predicate; IDs for which it returns True are skipped
+        max_attempts: Bound on draws (defaults to 4k), so heavily excluded
+            neighbourhoods cannot make sampling unbounded
+        """
+        with self._lock:
+            bands = self._bands
+        home = self.band_of(rating)
+
+        choices = []
+        weights = []
+        for offset in range(-self.max_band_offset, self.max_band_offset + 1):
+            members = bands.get(home + offset)
+            weight = self._band_weight(rating, offset)
+            if members and weight > 0:
+                choices.append(members)
+                weights.append(weight)
+        if not choices:
+            return []
+
+        picked = []
+        picked_ids = set()
+        attempts = max_attempts or 4 * k
+        for members in random.choices(choices, weights=weights, k=attempts):
+            if len(picked) >= k:
+                break
+            user_id = random.choice(members)
+            if user_id in picked_ids or (exclude and exclude(user_id)):
+                continue
+            picked_ids.add(user_id)
+            picked.append(user_id)
+        return picked
+
+
+class DiscoveryEngine:
+    """
+    Finds users for someone to rate without scanning the users table
+
+    Candidates are drawn by EloBandSampler from Elo bands around the requester,
+    so consecutive calls (and different users) see varied profiles. When the
+    bands cannot supply enough, the elo-index GSI is walked in two directions
+    from the requester's Elo, one bounded page at a time. Either way the work
+    per call depends on the number of candidates requested rather than on the
+    number of users in the app. Already-rated users are excluded with the
+    requester's Bloom filter; users it flags are only checked exactly when
+    there are not enough other candidates.
+    """
+
+    def __init__(self, db, elo, page_size=None, max_pages=None, max_elo_distance=None, max_exact_checks=None,
+                 sampler=None):
+        """
+        db: Database instance
+        elo: EloSystem instance
+        page_size: Users read from the index per query
+        max_pages: Upper bound on index queries per discovery call
+        max_elo_distance: How far from the requester's Elo to look
+        max_exact_checks: Upper bound on exact "already rated" lookups per call
+        sampler: EloBandSampler to use (one is built from `elo` by default)
+        """
+        self.db = db
+        self.page_size = page_size or int(os.getenv('DISCOVERY_PAGE_SIZE', '50'))
+        self.max_pages = max_pages or int(os.getenv('DISCOVERY_MAX_PAGES', '8'))
+        self.max_elo_distance = max_elo_distance or float(os.getenv('DISCOVERY_MAX_ELO_DISTANCE', '600'))
+        self.max_exact_checks = max_exact_checks or int(os.getenv('DISCOVERY_MAX_EXACT_CHECKS', '5'))
+        self.sampler = sampler or EloBandSampler(elo)
+        self._rebuild_lock = threading.Lock()
+
+    def _refresh_bands(self):
+        if not self.sampler.needs_rebuild():
+            return
+        if not self._rebuild_lock.acquire(blocking=False):
+            return  # Another request is rebuilding; keep using the current bands
+        try:
+            self.sampler.rebuild(self.db.get_ranked_entries())
+        except LeaderboardUnavailableError as e:
+            # Keep the current bands; the Elo index walk covers the shortfall
+            print(f"Error rebuilding discovery bands: {e}")
+        finally:
+            self._rebuild_lock.release()
+
+    def discover(self, user, limit=20):
+        """
+        Get up to `limit` users that `user` has not rated yet, sampled from
+        Elo bands around them
+        """
+        user_id = user['id']
+        user_elo = user['elo_rating']
+        seen = self.db.get_seen_filter(user_id)
+
+        candidates = {}
+        maybe_seen = {}
+
+        def is_excluded(candidate_id):
+            return candidate_id == user_id or candidate_id in seen
+
+        self._refresh_bands()
+        sampled_ids = self.sampler.sample(user_elo, limit, exclude=is_excluded)
+        if sampled_ids:
+            users = self.db.get_users(sampled_ids)
+            for candidate_id in sampled_ids:
+                if candidate_id in users:
+                    candidates[candidate_id] = users[candidate_id]
+
+        if len(candidates) < limit:
+            self._walk_index(user_id, user_elo, limit, seen, candidates, maybe_seen)
+
+        # Bloom filters can report false positives, so when short of candidates
+        # recover the flagged users that were never actually rated
+        for candidate_id, candidate in list(maybe_seen.items())[:self.max_exact_checks]:
+            if len(candidates) >= limit:
+                break
+            if not self.db.has_rated(user_id, candidate_id):
+                candidates[candidate_id] = candidate
+
+        return list(candidates.values())[:limit]
+
+    def _walk_index(self, user_id, user_elo, limit, seen, candidates, maybe_seen):
+        """Top up `candidates` from the elo-index, closest Elo first"""
+        # One cursor walks up the Elo index from the user, the other walks down
+        walks = [
+            {'low': user_elo, 'high': user_elo + self.max_elo_distance,
+             'descending': False, 'start_key': None, 'done': False},
+            {'low': user_elo - self.max_elo_distance, 'high': user_elo,
+             'descending': True, 'start_key': None, 'done': False}
+        ]
+
+        found = {}
+        pages = 0
+        while len(candidates) + len(found) < limit and pages < self.max_pages:
+            active = [walk for walk in walks if not walk['done']]
+            if not active:
+                break
+
+            for walk in active:
+                users, last_key = self.db.query_elo_range(
+                    low=walk['low'],
+                    high=walk['high'],
+                    descending=walk['descending'],
+                    limit=self.page_size,
+                    start_key=walk['start_key']
+                )
+                pages += 1
+                walk['start_key'] = last_key
+                walk['done'] = last_key is None
+
+                for candidate in users:
+                    candidate_id = candidate['id']
+                    if candidate_id == user_id or candidate_id in candidates:
+                        continue
+                    if candidate_id in seen:
+                        maybe_seen[candidate_id] = candidate
+                        continue
+                    found[candidate_id] = candidate
+
+        for candidate in sorted(found.values(), key=lambda c: abs(c['elo_rating'] - user_elo)):
+            candidates[candidate['id']] = candidate
@@ -0,0 +1,70 @@
+"""
+Shared DynamoDB connection layer for the app and the scripts
+
+One boto3 session and resource per process, built with a tuned botocore
+Config so concurrent request threads (and parallel scan workers) reuse pooled
+keep-alive HTTP connections instead of queueing on botocore's default pool of
+10. The low-level client is resource.meta.client, so both share the pool.
+"""
+
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+_lock = threading.Lock()
+_resource = None
+
+
+def _env_bool(name, default):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+
+def botocore_config():
+    """botocore Config from the DYNAMODB_* tuning variables"""
+    return Config(
+        max_pool_connections=int(os.getenv('DYNAMODB_MAX_POOL_CONNECTIONS', '50')),
+        tcp_keepalive=_env_bool('DYNAMODB_TCP_KEEPALIVE', 'true'),
+        connect_timeout=float(os.getenv('DYNAMODB_CONNECT_TIMEOUT', '2')),
+        read_timeout=float(os.getenv('DYNAMODB_READ_TIMEOUT', '5')),
+        retries={
+            # adaptive adds client-side rate limiting on throttling errors
+            'mode': os.getenv('DYNAMODB_RETRY_MODE', 'adaptive'),
+            'max_attempts': int(os.getenv('DYNAMODB_MAX_ATTEMPTS', '10'))
+        }
+    )
+
+
+def create_resource():
+    """Build a new DynamoDB resource from AWS_* / DYNAMODB_ENDPOINT_URL and the tuned config"""
+    session = boto3.Session(
+        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+        region_name=os.getenv('AWS_REGION', 'us-east-1')
+    )
+
+    kwargs = {'config': botocore_config()}
+    endpoint_url = os.getenv('DYNAMODB_ENDPOINT_URL')  # For local DynamoDB
+    if endpoint_url:
+        kwargs['endpoint_url'] = endpoint_url
+    return session.resource('dynamodb', **kwargs)
+
+
+def get_resource():
+    """The process-wide DynamoDB resource, created on first use"""
+    global _resource
+    if _resource is None:
+        with _lock:
+            if _resource is None:
+                _resource = create_resource()
+    return _resource
+
+
+def get_client():
+    """Low-level client sharing the resource's connection pool"""
+    return get_resource().meta.client
@@ -0,0 +1,88 @@
+class EloHistogram:
+    """
+    Fixed-width histogram of Elo ratings
+
+    Buckets are keyed by their lower bound as a string (e.g. '1200' holds
+    1200 <= elo < 1210), which is how they are stored in the DynamoDB map on
+    the global stats item. Every query is O(number of buckets), independent of
+    the number of users.
+    """
+
+    def __init__(self, counts=None, bucket_width=10, min_rating=100, max_rating=3000):
+        """
+        counts: {bucket key: number of users}
+        bucket_width: Width of one bucket in Elo points
+        min_rating / max_rating: Elo bounds enforced by EloSystem
+        """
+        self.bucket_width = bucket_width
+        self.min_rating = min_rating
+        self.max_rating = max_rating
+        self.counts = {}
+        for key, count in (counts or {}).items():
+            if int(count) > 0:
+                self.counts[int(key)] = int(count)
+
+    def bucket_key(self, rating):
+        """Map key of the bucket holding `rating`"""
+        rating = max(self.min_rating, min(self.max_rating, float(rating)))
+        return str(int(rating // self.bucket_width * self.bucket_width))
+
+    def _sorted_buckets(self):
+        return sorted(self.counts.items())
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    @property
+    def lowest(self):
+        """Lower bound of the lowest non-empty bucket"""
+        return min(self.counts) if self.counts else 0
+
+    @property
+    def highest(self):
+        """Upper bound of the highest non-empty bucket (capped at the Elo maximum)"""
+        if not self.counts:
+            return 0
+        return min(self.max_rating, max(self.counts) + self.bucket_width)
+
+    def percentile(self, p):
+        """Elo rating below which p percent of users fall (linear within a bucket)"""
+        total = self.total
+        if not total:
+            return 0
+        target = total * p / 100.0
+        cumulative = 0
+        for lower, count in self._sorted_buckets():
+            if cumulative + count >= target:
+                fraction = (target - cumulative) / count
+                return round(lower + fraction * self.bucket_width, 2)
+            cumulative += count
+        return self.highest
+
+    def percentile_of(self, rating):
+        """Percentage of users rated below `rating` (linear within its bucket)"""
+        total = self.total
+        if not total:
+            return 0
+        rating = float(rating)
+        below = 0
+        for lower, count in self._sorted_buckets():
+            if lower + self.bucket_width <= rating:
+                below += count
+            elif lower <= rating:
+                below += count * (rating - lower) / self.bucket_width
+            else:
+                break
+        return round(below / total * 100, 2)
+
+    def distribution(self):
+        """Non-empty buckets in ascending Elo order"""
+        return [
+            {
+                'min_elo': lower,
+                'max_elo': lower + self.bucket_width,
+                'count': count
+            }
+            for lower, count in self._sorted_buckets()
+        ]
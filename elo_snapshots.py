@@ -0,0 +1,108 @@
+import glob
+import gzip
+import json
+import os
+import re
+from datetime import datetime, timedelta
+
+# Directory holding snapshot files
+SNAPSHOT_DIR = os.getenv('ELO_SNAPSHOT_DIR', 'snapshots')
+
+# Rating records can land well after their created_at (write-behind queue,
+# retries), so replay snapshots are never positioned within this many seconds
+# of the present: a record arriving later would fall behind the snapshot and
+# be skipped by every replay that starts from it
+SETTLE_SECONDS = float(os.getenv('ELO_SNAPSHOT_SETTLE_SECONDS', '300'))
+
+
+def _file_stamp(created_at):
+    """Sortable, filesystem-safe form of an ISO timestamp"""
+    return re.sub(r'[^0-9T]', '', created_at)
+
+
+def settled_cutoff(settle_seconds=SETTLE_SECONDS):
+    """ISO timestamp before which every rating record is assumed to be written"""
+    return (datetime.utcnow() - timedelta(seconds=settle_seconds)).isoformat()
+
+
+def write_snapshot(position, ratings_applied, elo, k_factor, formula_version, directory=SNAPSHOT_DIR):
+    """
+    Write a compact columnar snapshot of every user's Elo
+
+    Args:
+        position: (created_at, rating_id) of the last rating applied
+        ratings_applied: Number of ratings applied to reach this state (None
+            if unknown, e.g. for a snapshot of the stored Elo)
+        elo: {user_id: elo}
+        k_factor: K-factor the ratings were replayed with
+        formula_version: EloSystem.FORMULA_VERSION the ratings were replayed with
+
+    Returns:
+        str: Path of the snapshot file
+    """
+    os.makedirs(directory, exist_ok=True)
+    created_at, rating_id = position
+    path = os.path.join(directory, f"elo-{_file_stamp(created_at)}-{rating_id}.json.gz")
+
+    user_ids = list(elo)
+    snapshot = {
+        'created_at': created_at,
+        'rating_id': rating_id,
+        'ratings_applied': ratings_applied,
+        'k_factor': k_factor,
+        'formula_version': formula_version,
+        # Columnar layout: one list of IDs, one of ratings
+        'user_ids': user_ids,
+        'elo': [elo[user_id] for user_id in user_ids]
+    }
+
+    # Write then rename so a crash never leaves a truncated snapshot behind
+    temp_path = path + '.tmp'
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+    os.replace(temp_path, path)
+    return path
+
+
+def read_snapshot(path):
+    """
+    Load a snapshot file
+
+    Returns:
+        dict with position ((created_at, rating_id)), ratings_applied,
+        k_factor, formula_version (None for snapshots that predate it) and
+        elo ({user_id: elo})
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        snapshot = json.load(f)
+    return {
+        'position': (snapshot['created_at'], snapshot['rating_id']),
+        'ratings_applied': snapshot['ratings_applied'],
+        'k_factor': snapshot['k_factor'],
+        'formula_version': snapshot.get('formula_version'),
+        'elo': dict(zip(snapshot['user_ids'], snapshot['elo']))
+    }
+
+
+def find_snapshot(as_of=None, k_factor=None, formula_version=None, directory=SNAPSHOT_DIR):
+    """
+    Path of the newest snapshot taken at or before `as_of` (an ISO timestamp;
+    None for the newest overall), optionally restricted to one K-factor and
+    formula version. Returns None if there is none.
+    """
+    limit = _file_stamp(as_of) if as_of else None
+    candidates = []
+    for path in glob.glob(os.path.join(directory, 'elo-*.json.gz')):
+        stamp = os.path.basename(path).split('-')[1]
+        if limit is None or stamp <= limit:
+            candidates.append((stamp, path))
+
+    # Newest first; K-factor and formula version are only known after opening the file
+    for _, path in sorted(candidates, reverse=True):
+        snapshot = read_snapshot(path)
+        if k_factor is not None and snapshot['k_factor'] != k_factor:
+            continue
+        if formula_version is not None and snapshot['formula_version'] != formula_version:
+            continue
+        return path
+    return None
@@ -1,6 +1,10 @@
 import math
 
 class EloSystem:
+    # Bump whenever calculate_new_ratings changes its results, so Elo snapshots
+    # replayed with the old formula are no longer reused
+    FORMULA_VERSION = 1
+    
     def __init__(self, k_factor=32):
         """
         Initialize Elo rating system
@@ -76,6 +80,59 @@ class EloSystem:
         
         return new_rater_rating, new_rated_rating
     
+    def calculate_new_ratings_batch(self, rater_ratings, rated_ratings, user_ratings, outcomes):
+        """
+        Vectorized calculate_new_ratings for many independent interactions
+        
+        Every position i matches
+        calculate_new_ratings(rater_ratings[i], rated_ratings[i], user_ratings[i], outcomes[i])
+        up to floating-point rounding (test_elo_batch.py checks this), so
+        interactions that must see each other's results (e.g. the same user
+        twice in a row) belong in separate batches.
+        
+        Args:
+            rater_ratings: Array-like of rater Elo ratings
+            rated_ratings: Array-like of rated Elo ratings
+            user_ratings: Array-like of ratings given (1-10 scale)
+            outcomes: Array-like of booleans, True for a match
+        
+        Returns:
+            tuple: (new_rater_ratings, new_rated_ratings) as numpy float64 arrays
+        """
+        # Imported here so loading the module (and the app) does not pay for numpy
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("numpy is required for batch Elo calculations")
+        
+        rater = np.asarray(rater_ratings, dtype=np.float64)
+        rated = np.asarray(rated_ratings, dtype=np.float64)
+        score = np.asarray(user_ratings, dtype=np.float64)
+        outcome = np.asarray(outcomes, dtype=bool)
+        
+        # Same 1-10 -> 0-1 mapping as the scalar path
+        normalized_score = np.where(
+            score <= 4,
+            (score - 1) / 9,
+            np.where(score <= 6, 0.5, 0.5 + (score - 6) * 0.125)
+        )
+        
+        expected_rater = 1 / (1 + np.power(10.0, (rated - rater) / 400))
+        expected_rated = 1 / (1 + np.power(10.0, (rater - rated) / 400))
+        
+        match_rater_score = np.where(score >= 8, 1.0, np.where(score >= 6, 0.8, 0.6))
+        actual_rater_score = np.where(outcome, match_rater_score, 0.5)
+        actual_rated_score = np.where(outcome, np.minimum(1.0, normalized_score + 0.2), normalized_score)
+        
+        rater_k = self.k_factor * np.where(rater < 1400, 1.0, np.where(rater < 1800, 0.8, 0.6))
+        rated_k = self.k_factor * np.where(rated < 1400, 1.0, np.where(rated < 1800, 0.8, 0.6))
+        
+        new_rater_ratings = rater + rater_k * (actual_rater_score - expected_rater)
+        new_rated_ratings = rated + rated_k * (actual_rated_score - expected_rated)
+        
+        # Ensure ratings don't go below 100 or above 3000
+        return np.clip(new_rater_ratings, 100, 3000), np.clip(new_rated_ratings, 100, 3000)
+    
     def get_rating_impact(self, rating_given, is_match):
         """
         Get a description of how the rating will impact the Elo
@@ -0,0 +1,182 @@
+import threading
+import time
+
+
+class RankedLeaderboard:
+    """
+    In-memory order-statistic index of users by Elo rating
+
+    Ratings are bucketed at a fixed resolution and bucket populations are kept
+    in a Fenwick (binary indexed) tree, so counting the users above a rating,
+    finding the k-th best user and applying a rating change are all O(log n)
+    in the number of buckets. Users inside a bucket are ordered by their exact
+    rating, so ranks match a full sort.
+    """
+
+    def __init__(self, min_rating=100, max_rating=3000, resolution=1.0, reconcile_interval=300):
+        """
+        min_rating / max_rating: Elo bounds enforced by EloSystem
+        resolution: Width of one bucket in Elo points
+        reconcile_interval: Seconds after which the index should be rebuilt
+            from the database to correct any drift
+        """
+        self.min_rating = min_rating
+        self.max_rating = max_rating
+        self.resolution = resolution
+        self.reconcile_interval = reconcile_interval
+        self.bucket_count = int((max_rating - min_rating) / resolution) + 1
+
+        self._lock = threading.Lock()
+        self._reset()
+        self.last_reconciled = None
+        self._pending = None
+
+    def _reset(self):
+        self._tree = [0] * (self.bucket_count + 1)
+        self._buckets = {}
+        self._ratings = {}
+
+    def _position(self, rating):
+        """Fenwick position (1-based) of a rating; higher ratings come first"""
+        rating = max(self.min_rating, min(self.max_rating, rating))
+        bucket = int((rating - self.min_rating) / self.resolution)
+        return self.bucket_count - bucket
+
+    def _add(self, position, delta):
+        while position <= self.bucket_count:
+            self._tree[position] += delta
+            position += position & -position
+
+    def _prefix(self, position):
+        """Number of users in positions 1..position"""
+        total = 0
+        while position > 0:
+            total += self._tree[position]
+            position -= position & -position
+        return total
+
+    def _find_kth(self, k):
+        """Smallest position whose prefix count is >= k (k is 1-based)"""
+        position = 0
+        step = 1 << self.bucket_count.bit_length()
+        while step:
+            next_position = position + step
+            if next_position <= self.bucket_count and self._tree[next_position] < k:
+                position = next_position
+                k -= self._tree[next_position]
+            step >>= 1
+        return position + 1
+
+    def _insert(self, user_id, rating):
+        position = self._position(rating)
+        self._ratings[user_id] = rating
+        self._buckets.setdefault(position, set()).add(user_id)
+        self._add(position, 1)
+
+    def _remove(self, user_id):
+        rating = self._ratings.pop(user_id, None)
+        if rating is None:
+            return
+        position = self._position(rating)
+        members = self._buckets[position]
+        members.discard(user_id)
+        if not members:
+            del self._buckets[position]
+        self._add(position, -1)
+
+    def update(self, user_id, rating):
+        """Insert a user or move them to a new rating"""
+        rating = float(rating)
+        with self._lock:
+            self._remove(user_id)
+            self._insert(user_id, rating)
+            if self._pending is not None:
+                self._pending[user_id] = rating
+
+    def __len__(self):
+        return len(self._ratings)
+
+    def __contains__(self, user_id):
+        return user_id in self._ratings
+
+    def get_rating(self, user_id):
+        return self._ratings.get(user_id)
+
+    def items(self):
+        """Snapshot of all (user_id, rating) pairs"""
+        with self._lock:
+            return list(self._ratings.items())
+
+    def rank(self, user_id):
+        """1-based rank of a user (ties share a rank), or None if unknown"""
+        with self._lock:
+            rating = self._ratings.get(user_id)
+            if rating is None:
+                return None
+            position = self._position(rating)
+            above = self._prefix(position - 1)
+            above += sum(
+                1 for other_id in self._buckets[position]
+                if self._ratings[other_id] > rating
+            )
+            return above + 1
+
+    def top(self, limit, offset=0):
+        """
+        Get up to `limit` (user_id, rating) pairs starting at 0-based `offset`,
+        highest rating first
+        """
+        with self._lock:
+            total = len(self._ratings)
+            results = []
+            k = offset + 1
+            while k <= total and len(results) < limit:
+                position = self._find_kth(k)
+                before = self._prefix(position - 1)
+                members = sorted(
+                    self._buckets[position],
+                    key=lambda member_id: self._ratings[member_id],
+                    reverse=True
+                )
+                skip = k - before - 1
+                for member_id in members[skip:]:
+                    if len(results) == limit:
+                        break
+                    results.append((member_id, self._ratings[member_id]))
+                k = before + len(members) + 1
+            return results
+
+    def needs_reconcile(self):
+        """True if the index was never loaded or is older than the interval"""
+        if self.last_reconciled is None:
+            return True
+        return time.monotonic() - self.last_reconciled >= self.reconcile_interval
+
+    def begin_reconcile(self):
+        """
+        Start tracking live updates so a reload from a (slow) database scan
+        does not overwrite changes that happen while the scan runs
+        """
+        with self._lock:
+            self._pending = {}
+
+    def abort_reconcile(self):
+        """Stop tracking updates after a failed reload"""
+        with self._lock:
+            self._pending = None
+
+    def finish_reconcile(self, entries):
+        """
+        Replace the index with `entries` ((user_id, rating) pairs read from the
+        database), then re-apply updates recorded since begin_reconcile
+        """
+        with self._lock:
+            pending = self._pending or {}
+            self._pending = None
+            self._reset()
+            for user_id, rating in entries:
+                self._insert(user_id, float(rating))
+            for user_id, rating in pending.items():
+                self._remove(user_id)
+                self._insert(user_id, rating)
+            self.last_reconciled = time.monotonic()
@@ -0,0 +1,189 @@
+import base64
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+# Marks the end of one segment in parallel_scan's page queue
+_SEGMENT_DONE = object()
+
+
+def encode_cursor(last_evaluated_key, **state):
+    """
+    Encode a DynamoDB LastEvaluatedKey (plus any extra paging state) into an
+    opaque, URL-safe cursor string. Returns None when there is neither a key
+    nor state, i.e. no next page.
+    """
+    if not last_evaluated_key and not state:
+        return None
+
+    # Keep the key typed so Number keys round-trip as Decimal, not str
+    key = {}
+    for name, value in (last_evaluated_key or {}).items():
+        if isinstance(value, Decimal):
+            key[name] = {'N': str(value)}
+        else:
+            key[name] = {'S': value}
+
+    payload = json.dumps({'key': key, 'state': state}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Returns:
+        tuple: (exclusive_start_key, state) - (None, {}) for an empty cursor
+
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    if not cursor:
+        return None, {}
+
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+
+        key = {}
+        for name, typed_value in payload['key'].items():
+            if 'N' in typed_value:
+                key[name] = Decimal(typed_value['N'])
+            else:
+                key[name] = typed_value['S']
+
+        return key or None, payload.get('state', {})
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def parse_limit(value, default=50, maximum=100):
+    """Parse a ?limit= query parameter, clamping it to [1, maximum]"""
+    if value is None or value == '':
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    return max(1, min(maximum, limit))
+
+
+def paginate(operation, page_size=None, max_items=None, **kwargs):
+    """
+    Stream items from a DynamoDB scan or query, following LastEvaluatedKey
+    across pages so results are never silently truncated at 1 MB
+
+    Args:
+        operation: Bound table method, e.g. table.scan or table.query
+        page_size: Optional Limit sent with each request
+        max_items: Stop after yielding this many items
+        **kwargs: Passed through to every request
+    """
+    if page_size:
+        kwargs['Limit'] = page_size
+
+    yielded = 0
+    while True:
+        response = operation(**kwargs)
+        for item in response.get('Items', []):
+            yield item
+            yielded += 1
+            if max_items and yielded >= max_items:
+                return
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            return
+        kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+
+def fetch_page(operation, limit, cursor=None, **kwargs):
+    """
+    Read one page of a scan or query for cursor-paginated endpoints
+
+    Returns:
+        tuple: (items, next_cursor) - next_cursor is None on the last page
+
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    start_key, _ = decode_cursor(cursor)
+    if start_key:
+        kwargs['ExclusiveStartKey'] = start_key
+
+    response = operation(Limit=limit, **kwargs)
+    return response.get('Items', []), encode_cursor(response.get('LastEvaluatedKey'))
+
+
+def parallel_scan(table, total_segments=4, max_workers=None, page_size=None, max_buffered_pages=None, **kwargs):
+    """
+    Stream every item of a table using a DynamoDB parallel scan
+
+    The table is split into `total_segments` (Segment/TotalSegments) that are
+    scanned concurrently on a thread pool. Pages are handed back through a
+    bounded queue, so memory stays at roughly `max_buffered_pages` pages no
+    matter how large the table is, and items are yielded as soon as any
+    segment produces them (in no particular order).
+
+    Args:
+        table: boto3 Table resource
+        total_segments: Number of scan segments
+        max_workers: Threads scanning at once (defaults to total_segments)
+        page_size: Optional Limit sent with each request
+        max_buffered_pages: Pages allowed to wait in the queue (defaults to 2 per worker)
+        **kwargs: Passed through to every scan (FilterExpression, ProjectionExpression...)
+    """
+    max_workers = max_workers or total_segments
+    pages = queue.Queue(maxsize=max_buffered_pages or 2 * max_workers)
+    stop = threading.Event()
+    # The low-level client is thread-safe; Table resources are not
+    client = table.meta.client
+
+    def put(entry):
+        # Block while the consumer is behind, but give up once it has gone away
+        while not stop.is_set():
+            try:
+                pages.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def scan_segment(segment):
+        scan_kwargs = dict(kwargs, TableName=table.name, Segment=segment, TotalSegments=total_segments)
+        if page_size:
+            scan_kwargs['Limit'] = page_size
+        try:
+            while not stop.is_set():
+                response = client.scan(**scan_kwargs)
+                if not put(response.get('Items', [])):
+                    return
+                last_evaluated_key = response.get('LastEvaluatedKey')
+                if not last_evaluated_key:
+                    break
+                scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+        except Exception as e:
+            put(e)
+            return
+        put(_SEGMENT_DONE)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for segment in range(total_segments):
+            executor.submit(scan_segment, segment)
+
+        remaining = total_segments
+        while remaining:
+            entry = pages.get()
+            if entry is _SEGMENT_DONE:
+                remaining -= 1
+            elif isinstance(entry, Exception):
+                raise entry
+            else:
+                yield from entry
+    finally:
+        # Also runs when the caller stops iterating early
+        stop.set()
+        executor.shutdown(wait=False)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Replay every rating in created_at order to recompute all users' Elo
+
+Use this after changing the Elo formula (K-factor tiers, score mapping...) to
+apply it retroactively, or with --dry-run to audit drift between the stored
+ratings and a clean replay. Run it while ratings are not being written: the
+write step replaces whole user items.
+
+With --snapshot-every N, every N ratings the replayed state is saved as a compact
+snapshot (see elo_snapshots.py); --snapshot-stored snapshots the stored Elo
+with a single users-table scan, cheap enough to run on a schedule. --as-of
+reconstructs everyone's Elo at a past moment, and --resume replays, from the
+nearest earlier snapshot plus the ratings after it, so the work is bounded by
+the tail rather than the whole history.
+"""
+
+import argparse
+import bisect
+import os
+import sys
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from boto3.dynamodb.conditions import Attr
+from database import Database
+from elo_snapshots import find_snapshot, read_snapshot, settled_cutoff, write_snapshot
+from elo_system import EloSystem
+from setup_dynamodb import rebuild_global_stats
+
+# Elo every user starts with (see Database.create_user)
+INITIAL_ELO = 1200.0
+
+def load_ratings(db, after=None, until=None):
+    """
+    Read rating records as (created_at, id, rater_id, rated_id, rating, is_match),
+    sorted into replay order
+
+    Args:
+        after: Optional (created_at, id) position; only ratings after it are read
+        until: Optional ISO timestamp; ratings created later are skipped
+    """
+    filter_expression = Attr('rater_id').exists()  # Skip PAIR# items
+    if after:
+        # >= so ratings sharing the position's timestamp are kept for the id tie-break
+        filter_expression = filter_expression & Attr('created_at').gte(after[0])
+    if until:
+        filter_expression = filter_expression & Attr('created_at').lte(until)
+
+    ratings = [
+        (item['created_at'], item['id'], item['rater_id'], item['rated_id'], int(item['rating']), bool(item['is_match']))
+        for item in db.scan_all(
+            db.ratings_table,
+            FilterExpression=filter_expression,
+            ProjectionExpression='id, rater_id, rated_id, rating, is_match, created_at'
+        )
+    ]
+    if after:
+        ratings = [rating for rating in ratings if rating[:2] > tuple(after)]
+    # The id breaks ties between ratings created in the same microsecond
+    ratings.sort()
+    return ratings
+
+def replay(ratings, elo_system, initial=None, checkpoint_every=None, on_checkpoint=None):
+    """
+    Apply ratings in order and return {user_id: elo}
+
+    Args:
+        ratings: Sorted tuples from load_ratings
+        initial: Optional {user_id: elo} to start from instead of INITIAL_ELO
+        checkpoint_every: Call on_checkpoint(position, applied, elo) after every
+            this many ratings, position being the (created_at, id) of the last one
+    """
+    elo = dict(initial or {})
+    for applied, (created_at, rating_id, rater_id, rated_id, rating, is_match) in enumerate(ratings, 1):
+        elo[rater_id], elo[rated_id] = elo_system.calculate_new_ratings(
+            elo.get(rater_id, INITIAL_ELO),
+            elo.get(rated_id, INITIAL_ELO),
+            rating,
+            is_match
+        )
+        if checkpoint_every and on_checkpoint and applied % checkpoint_every == 0:
+            on_checkpoint((created_at, rating_id), applied, elo)
+    return elo
+
+def reconstruct(db, elo_system, as_of):
+    """
+    Everyone's Elo as of an ISO timestamp: start from the newest snapshot taken
+    at or before it (same K-factor and formula version) and replay only the
+    ratings after it
+
+    Returns:
+        tuple: (elo, snapshot path or None, number of tail ratings replayed)
+    """
+    path = find_snapshot(as_of, k_factor=elo_system.k_factor, formula_version=elo_system.FORMULA_VERSION)
+    snapshot = read_snapshot(path) if path else None
+
+    ratings = load_ratings(db, after=snapshot['position'] if snapshot else None, until=as_of)
+    elo = replay(ratings, elo_system, initial=snapshot['elo'] if snapshot else None)
+    return elo, path, len(ratings)
+
+def snapshot_stored(db, elo_system):
+    """
+    Snapshot every user's stored Elo with one users-table scan, far cheaper
+    than replaying the history. Its position is the scan start: ratings
+    created before it count as applied, which holds for records still in the
+    write-behind queue too, since their Elo is applied synchronously. A rating
+    committed while the scan runs may be in the snapshot for one of its users
+    only, so schedule this when few ratings are being written.
+    
+    Returns:
+        str: Path of the snapshot file
+    """
+    started_at = datetime.utcnow().isoformat()
+    elo = {
+        item['id']: float(item['elo_rating'])
+        for item in db.scan_all(db.users_table, ProjectionExpression='id, elo_rating')
+    }
+    # An empty rating id sorts before every real one, so ratings sharing the
+    # scan-start timestamp are treated as newer than the snapshot
+    return write_snapshot((started_at, ''), None, elo, elo_system.k_factor, elo_system.FORMULA_VERSION)
+
+def audit(stored, replayed, threshold=0.01):
+    """
+    Compare stored and replayed Elo for every stored user
+
+    Returns:
+        list of (user_id, stored, replayed, drift) with |drift| > threshold,
+        largest drift first
+    """
+    drifted = []
+    for user_id, stored_elo in stored.items():
+        replayed_elo = replayed.get(user_id, INITIAL_ELO)
+        drift = replayed_elo - stored_elo
+        if abs(drift) > threshold:
+            drifted.append((user_id, stored_elo, replayed_elo, drift))
+    drifted.sort(key=lambda row: abs(row[3]), reverse=True)
+    return drifted
+
+def write_replayed(db, replayed):
+    """
+    Write replayed Elo back to every user item with batch_writer, then drop
+    the rewritten profiles and every Elo-scoped entry from the app cache
+    """
+    written_ids = []
+    with db.users_table.batch_writer(overwrite_by_pkeys=['id']) as batch:
+        for item in db.scan_all(db.users_table):
+            item['elo_rating'] = Decimal(str(replayed.get(item['id'], INITIAL_ELO)))
+            # Invalidate any in-flight optimistic rating transaction
+            item['version'] = item.get('version', 0) + 1
+            batch.put_item(Item=item)
+            written_ids.append(item['id'])
+    
+    for start in range(0, len(written_ids), 1000):
+        db.cache.invalidate('user', *written_ids[start:start + 1000])
+    db.cache.bump('elo')
+    return len(written_ids)
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute every user's Elo by replaying all ratings")
+    parser.add_argument('--dry-run', action='store_true', help='Only report drift, do not write')
+    parser.add_argument('--k-factor', type=float, default=32, help='K-factor for the replay (default: 32)')
+    parser.add_argument('--threshold', type=float, default=0.01, help='Drift to report, in Elo points')
+    parser.add_argument('--top', type=int, default=10, help='Number of drifted users to list')
+    parser.add_argument('--snapshot-every', type=int, default=0,
+                        help='Save a snapshot every N replayed ratings, e.g. 1000000 (default: 0, disabled)')
+    parser.add_argument('--as-of', metavar='TIMESTAMP',
+                        help='Only reconstruct Elo at this ISO timestamp from the nearest snapshot; writes nothing')
+    parser.add_argument('--resume', action='store_true',
+                        help='Start from the newest snapshot with the same K-factor and formula version '
+                             'instead of the first rating')
+    parser.add_argument('--snapshot-stored', action='store_true',
+                        help="Only snapshot every user's stored Elo (one users-table scan); writes nothing else")
+    args = parser.parse_args()
+
+    db = Database()
+    elo_system = EloSystem(k_factor=args.k_factor)
+
+    if args.snapshot_stored:
+        print(f"✓ Stored Elo snapshot written to {snapshot_stored(db, elo_system)}")
+        return
+
+    if args.as_of:
+        elo, path, replayed_count = reconstruct(db, elo_system, args.as_of)
+        source = f"snapshot {path}" if path else "the initial Elo (no snapshot found)"
+        print(f"Reconstructed {len(elo)} users as of {args.as_of} from {source} plus {replayed_count} ratings")
+        if args.as_of > settled_cutoff():
+            print("  Note: ratings this recent may still be in the write-behind queue and are missing if so")
+        for user_id, rating in sorted(elo.items(), key=lambda entry: entry[1], reverse=True)[:args.top]:
+            print(f"  {user_id}: {rating:.2f}")
+        return
+
+    snapshot = None
+    if args.resume:
+        path = find_snapshot(k_factor=elo_system.k_factor, formula_version=elo_system.FORMULA_VERSION)
+        snapshot = read_snapshot(path) if path else None
+        print(f"Resuming from snapshot {path}" if path else "No matching snapshot, replaying from the first rating")
+    applied_before = snapshot['ratings_applied'] if snapshot else 0
+
+    def save_snapshot(position, applied, elo):
+        total = None if applied_before is None else applied_before + applied
+        write_snapshot(position, total, elo, elo_system.k_factor, elo_system.FORMULA_VERSION)
+
+    print("Loading ratings...")
+    ratings = load_ratings(db, after=snapshot['position'] if snapshot else None)
+    # Only ratings old enough that no delayed record can still precede them are
+    # snapshotted; the rest are replayed on top afterwards
+    settled = bisect.bisect_right([rating[0] for rating in ratings], settled_cutoff())
+    print(f"Replaying {len(ratings)} ratings...")
+    replayed = replay(
+        ratings[:settled],
+        elo_system,
+        initial=snapshot['elo'] if snapshot else None,
+        checkpoint_every=args.snapshot_every,
+        on_checkpoint=save_snapshot
+    )
+    if args.snapshot_every and settled % args.snapshot_every:
+        # Snapshot the settled head too, so the next run only replays newer ratings
+        save_snapshot(ratings[settled - 1][:2], settled, replayed)
+    replayed = replay(ratings[settled:], elo_system, initial=replayed)
+
+    stored = {
+        item['id']: float(item['elo_rating'])
+        for item in db.scan_all(db.users_table, ProjectionExpression='id, elo_rating')
+    }
+    drifted = audit(stored, replayed, args.threshold)
+
+    print(f"\n{len(drifted)} of {len(stored)} users drift by more than {args.threshold} Elo")
+    for user_id, stored_elo, replayed_elo, drift in drifted[:args.top]:
+        print(f"  {user_id}: stored {stored_elo:.2f} → replayed {replayed_elo:.2f} ({drift:+.2f})")
+
+    if args.dry_run:
+        print("\nDry run, nothing written")
+        return
+
+    written = write_replayed(db, replayed)
+    print(f"\n✓ Replayed Elo written to {written} users")
+    rebuild_global_stats(db.dynamodb, db.users_table_name, db.stats_table_name, cache=db.cache)
+
+if __name__ == "__main__":
+    main()
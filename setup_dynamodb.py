@@ -2,124 +2,402 @@
 """
 Setup script for EloVe DynamoDB tables
 This script can be used to set up tables in AWS DynamoDB or local DynamoDB
+
+The app does not create tables itself: run `python setup_dynamodb.py migrate`
+once per deployment (or after pulling schema changes) before starting it.
+`rebuild-stats` recomputes counters from scratch and is for offline use only.
 """
 
-import boto3
+import argparse
 import os
+from boto3.dynamodb.conditions import Attr
 from dotenv import load_dotenv
+from decimal import Decimal
+from pagination import paginate, parallel_scan
+from elo_histogram import EloHistogram
+from dynamodb_config import get_resource
+from cache import create_cache
 
 # Load environment variables
 load_dotenv()
 
-def setup_dynamodb_tables():
-    """Set up DynamoDB tables for EloVe app"""
-    
-    # AWS Configuration
-    aws_region = os.getenv('AWS_REGION', 'us-east-1')
-    aws_access_key = os.getenv('AWS_ACCESS_KEY_ID')
-    aws_secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
-    endpoint_url = os.getenv('DYNAMODB_ENDPOINT_URL')  # For local DynamoDB
-    
-    # Table names
-    users_table_name = os.getenv('USERS_TABLE', 'elove-users')
-    ratings_table_name = os.getenv('RATINGS_TABLE', 'elove-ratings')
-    matches_table_name = os.getenv('MATCHES_TABLE', 'elove-matches')
-    
-    print(f"Setting up DynamoDB tables...")
-    print(f"Region: {aws_region}")
-    print(f"Endpoint: {endpoint_url or 'AWS DynamoDB'}")
-    print(f"Tables: {users_table_name}, {ratings_table_name}, {matches_table_name}")
-    
-    # Initialize DynamoDB client
-    session = boto3.Session(
-        aws_access_key_id=aws_access_key,
-        aws_secret_access_key=aws_secret_key,
-        region_name=aws_region
-    )
-    
-    if endpoint_url:
-        # For local development
-        dynamodb = session.resource('dynamodb', endpoint_url=endpoint_url)
-        client = session.client('dynamodb', endpoint_url=endpoint_url)
-    else:
-        dynamodb = session.resource('dynamodb')
-        client = session.client('dynamodb')
-    
-    # Check existing tables
-    existing_tables = client.list_tables()['TableNames']
-    print(f"Existing tables: {existing_tables}")
-    
-    # Create tables if they don't exist
-    tables_to_create = [
+# Keep in sync with database.LEADERBOARD_PARTITION / GLOBAL_STATS_ID
+LEADERBOARD_PARTITION = 'LEADERBOARD'
+GLOBAL_STATS_ID = 'global'
+
+# Only the profile fields the leaderboard and discovery return are projected,
+# so writes to seen_filter, version and the rating aggregates never touch the
+# index (its single partition is the hottest in the table)
+ELO_INDEX_ATTRIBUTES = ['name', 'age', 'bio', 'photo_url', 'created_at']
+
+ELO_INDEX = {
+    'IndexName': 'elo-index',
+    'KeySchema': [
+        {'AttributeName': 'leaderboard_pk', 'KeyType': 'HASH'},
+        {'AttributeName': 'elo_rating', 'KeyType': 'RANGE'}
+    ],
+    'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': ELO_INDEX_ATTRIBUTES}
+}
+
+USER2_INDEX = {
+    'IndexName': 'user2-index',
+    'KeySchema': [{'AttributeName': 'user2_id', 'KeyType': 'HASH'}],
+    'Projection': {'ProjectionType': 'ALL'}
+}
+
+def table_names():
+    """Table names from the environment, as Database reads them"""
+    return {
+        'users': os.getenv('USERS_TABLE', 'elove-users'),
+        'ratings': os.getenv('RATINGS_TABLE', 'elove-ratings'),
+        'matches': os.getenv('MATCHES_TABLE', 'elove-matches'),
+        'photos': os.getenv('PHOTOS_TABLE', 'elove-photos'),
+        'stats': os.getenv('STATS_TABLE', 'elove-stats')
+    }
+
+def table_schemas(names):
+    """create_table arguments for every EloVe table"""
+    return [
         {
-            'name': users_table_name,
-            'schema': {
-                'TableName': users_table_name,
-                'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
-                'AttributeDefinitions': [{'AttributeName': 'id', 'AttributeType': 'S'}],
-                'BillingMode': 'PAY_PER_REQUEST'
-            }
+            'TableName': names['users'],
+            'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [
+                {'AttributeName': 'id', 'AttributeType': 'S'},
+                {'AttributeName': 'leaderboard_pk', 'AttributeType': 'S'},
+                {'AttributeName': 'elo_rating', 'AttributeType': 'N'}
+            ],
+            'GlobalSecondaryIndexes': [ELO_INDEX],
+            'BillingMode': 'PAY_PER_REQUEST'
         },
         {
-            'name': ratings_table_name,
-            'schema': {
-                'TableName': ratings_table_name,
-                'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
-                'AttributeDefinitions': [
-                    {'AttributeName': 'id', 'AttributeType': 'S'},
-                    {'AttributeName': 'rater_id', 'AttributeType': 'S'},
-                    {'AttributeName': 'rated_id', 'AttributeType': 'S'}
-                ],
-                'GlobalSecondaryIndexes': [
-                    {
-                        'IndexName': 'rater-index',
-                        'KeySchema': [{'AttributeName': 'rater_id', 'KeyType': 'HASH'}],
-                        'Projection': {'ProjectionType': 'ALL'}
-                    },
-                    {
-                        'IndexName': 'rated-index',
-                        'KeySchema': [{'AttributeName': 'rated_id', 'KeyType': 'HASH'}],
-                        'Projection': {'ProjectionType': 'ALL'}
-                    }
-                ],
-                'BillingMode': 'PAY_PER_REQUEST'
-            }
+            'TableName': names['ratings'],
+            'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [
+                {'AttributeName': 'id', 'AttributeType': 'S'},
+                {'AttributeName': 'rater_id', 'AttributeType': 'S'},
+                {'AttributeName': 'rated_id', 'AttributeType': 'S'}
+            ],
+            'GlobalSecondaryIndexes': [
+                {
+                    'IndexName': 'rater-index',
+                    'KeySchema': [{'AttributeName': 'rater_id', 'KeyType': 'HASH'}],
+                    'Projection': {'ProjectionType': 'ALL'}
+                },
+                {
+                    'IndexName': 'rated-index',
+                    'KeySchema': [{'AttributeName': 'rated_id', 'KeyType': 'HASH'}],
+                    'Projection': {'ProjectionType': 'ALL'}
+                }
+            ],
+            'BillingMode': 'PAY_PER_REQUEST'
         },
         {
-            'name': matches_table_name,
-            'schema': {
-                'TableName': matches_table_name,
-                'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
-                'AttributeDefinitions': [
-                    {'AttributeName': 'id', 'AttributeType': 'S'},
-                    {'AttributeName': 'user1_id', 'AttributeType': 'S'}
-                ],
-                'GlobalSecondaryIndexes': [
-                    {
-                        'IndexName': 'user1-index',
-                        'KeySchema': [{'AttributeName': 'user1_id', 'KeyType': 'HASH'}],
-                        'Projection': {'ProjectionType': 'ALL'}
-                    }
-                ],
-                'BillingMode': 'PAY_PER_REQUEST'
-            }
+            'TableName': names['matches'],
+            'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [
+                {'AttributeName': 'id', 'AttributeType': 'S'},
+                {'AttributeName': 'user1_id', 'AttributeType': 'S'},
+                {'AttributeName': 'user2_id', 'AttributeType': 'S'}
+            ],
+            'GlobalSecondaryIndexes': [
+                {
+                    'IndexName': 'user1-index',
+                    'KeySchema': [{'AttributeName': 'user1_id', 'KeyType': 'HASH'}],
+                    'Projection': {'ProjectionType': 'ALL'}
+                },
+                USER2_INDEX
+            ],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': names['photos'],
+            'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [
+                {'AttributeName': 'id', 'AttributeType': 'S'},
+                {'AttributeName': 'user_id', 'AttributeType': 'S'}
+            ],
+            'GlobalSecondaryIndexes': [
+                {
+                    'IndexName': 'user-photos-index',
+                    'KeySchema': [{'AttributeName': 'user_id', 'KeyType': 'HASH'}],
+                    'Projection': {'ProjectionType': 'ALL'}
+                }
+            ],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': names['stats'],
+            'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'id', 'AttributeType': 'S'}],
+            'BillingMode': 'PAY_PER_REQUEST'
         }
     ]
+
+def create_tables(dynamodb, client, names):
+    """Create the tables that do not exist yet"""
+    existing_tables = client.list_tables()['TableNames']
+    print(f"Existing tables: {existing_tables}")
     
-    for table_config in tables_to_create:
-        table_name = table_config['name']
+    for schema in table_schemas(names):
+        table_name = schema['TableName']
         if table_name not in existing_tables:
             print(f"Creating table: {table_name}")
             try:
-                table = dynamodb.create_table(**table_config['schema'])
+                table = dynamodb.create_table(**schema)
                 table.wait_until_exists()
                 print(f"✓ Table {table_name} created successfully")
             except Exception as e:
                 print(f"✗ Error creating table {table_name}: {e}")
         else:
             print(f"✓ Table {table_name} already exists")
+
+def run_migrations(dynamodb, client, names):
+    """
+    Bring existing tables and items up to the current schema (indexes and
+    key attributes only; counters are left alone, see rebuild_stats)
+    """
+    migrate_leaderboard_index(dynamodb, client, names['users'])
+    migrate_matches(dynamodb, client, names['matches'])
+
+def rebuild_stats(dynamodb, names):
+    """
+    Recompute derived counters from the source tables. Offline only: this
+    overwrites live counters, so run it while the API is not writing ratings.
+    """
+    backfill_rating_aggregates(dynamodb, names['users'], names['ratings'])
+    rebuild_global_stats(dynamodb, names['users'], names['stats'])
+
+def print_status(client, names):
+    """Print each table's status and indexes"""
+    for name in names.values():
+        try:
+            description = client.describe_table(TableName=name)['Table']
+        except client.exceptions.ResourceNotFoundException:
+            print(f"✗ {name}: missing")
+            continue
+        indexes = ', '.join(
+            f"{index['IndexName']} ({index['IndexStatus']})"
+            for index in description.get('GlobalSecondaryIndexes', [])
+        )
+        print(f"✓ {name}: {description['TableStatus']}, {description.get('ItemCount', 0)} items"
+              + (f", indexes: {indexes}" if indexes else ""))
+
+def setup_dynamodb_tables(migrate=True):
+    """Set up DynamoDB tables for EloVe app"""
+    names = table_names()
+    
+    print(f"Setting up DynamoDB tables...")
+    print(f"Region: {os.getenv('AWS_REGION', 'us-east-1')}")
+    print(f"Endpoint: {os.getenv('DYNAMODB_ENDPOINT_URL') or 'AWS DynamoDB'}")
+    print(f"Tables: {', '.join(names.values())}")
+    
+    # Shared, pooled DynamoDB resource (see dynamodb_config.py)
+    dynamodb = get_resource()
+    client = dynamodb.meta.client
+    
+    create_tables(dynamodb, client, names)
+    if migrate:
+        run_migrations(dynamodb, client, names)
     
     print("\nDynamoDB setup complete!")
 
+def migrate_leaderboard_index(dynamodb, client, users_table_name):
+    """
+    Add the elo-index GSI to an existing users table and backfill the
+    leaderboard partition attribute on users created before it existed
+    """
+    description = client.describe_table(TableName=users_table_name)['Table']
+    index_names = [index['IndexName'] for index in description.get('GlobalSecondaryIndexes', [])]
+    
+    if 'elo-index' not in index_names:
+        print(f"Adding elo-index to {users_table_name}...")
+        client.update_table(
+            TableName=users_table_name,
+            AttributeDefinitions=[
+                {'AttributeName': 'leaderboard_pk', 'AttributeType': 'S'},
+                {'AttributeName': 'elo_rating', 'AttributeType': 'N'}
+            ],
+            GlobalSecondaryIndexUpdates=[{'Create': ELO_INDEX}]
+        )
+    
+    # Users without the partition attribute are invisible to the index
+    users_table = dynamodb.Table(users_table_name)
+    backfilled = 0
+    for item in paginate(
+        users_table.scan,
+        FilterExpression=Attr('leaderboard_pk').not_exists(),
+        ProjectionExpression='id'
+    ):
+        users_table.update_item(
+            Key={'id': item['id']},
+            UpdateExpression='SET leaderboard_pk = :pk',
+            ExpressionAttributeValues={':pk': LEADERBOARD_PARTITION}
+        )
+        backfilled += 1
+    
+    print(f"✓ Leaderboard partition backfilled on {backfilled} users")
+
+def backfill_rating_pairs(dynamodb, ratings_table_name):
+    """
+    Write the PAIR#<rater>#<rated> item for existing ratings so mutual match
+    checks can use get_item instead of querying rating history. One-off, for
+    data written before pair items existed. Pair items that already exist are
+    left alone: live ratings keep them current, and a blind overwrite could
+    replace one written during the scan with an older rating.
+    """
+    ratings_table = dynamodb.Table(ratings_table_name)
+    
+    # Keep only the latest rating per pair, matching what live writes produce
+    latest = {}
+    for item in parallel_scan(
+        ratings_table,
+        total_segments=int(os.getenv('SCAN_SEGMENTS', '4')),
+        FilterExpression=Attr('rater_id').exists()
+    ):
+        pair_id = f"PAIR#{item['rater_id']}#{item['rated_id']}"
+        if pair_id not in latest or item['created_at'] > latest[pair_id]['created_at']:
+            latest[pair_id] = {
+                'id': pair_id,
+                'rating_id': item['id'],
+                'is_match': item['is_match'],
+                'created_at': item['created_at']
+            }
+    
+    written = 0
+    for pair_item in latest.values():
+        try:
+            ratings_table.put_item(Item=pair_item, ConditionExpression='attribute_not_exists(id)')
+            written += 1
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            pass  # Already maintained by live writes
+    
+    print(f"✓ Rating pair items written for {written} of {len(latest)} pairs")
+
+def migrate_matches(dynamodb, client, matches_table_name):
+    """
+    Add the user2-index GSI to an existing matches table (DynamoDB backfills
+    the index from existing rows) and re-key matches created with random UUIDs
+    to the deterministic MATCH#<user1>#<user2> form, dropping duplicates
+    """
+    description = client.describe_table(TableName=matches_table_name)['Table']
+    index_names = [index['IndexName'] for index in description.get('GlobalSecondaryIndexes', [])]
+    
+    if 'user2-index' not in index_names:
+        print(f"Adding user2-index to {matches_table_name}...")
+        client.update_table(
+            TableName=matches_table_name,
+            AttributeDefinitions=[{'AttributeName': 'user2_id', 'AttributeType': 'S'}],
+            GlobalSecondaryIndexUpdates=[{'Create': USER2_INDEX}]
+        )
+    
+    matches_table = dynamodb.Table(matches_table_name)
+    
+    # Collect first so deleting rows does not disturb the scan
+    legacy_matches = list(paginate(matches_table.scan, FilterExpression=~Attr('id').begins_with('MATCH#')))
+    for item in legacy_matches:
+        user1_id, user2_id = sorted([item['user1_id'], item['user2_id']])
+        new_item = dict(item, id=f"MATCH#{user1_id}#{user2_id}", user1_id=user1_id, user2_id=user2_id)
+        try:
+            matches_table.put_item(Item=new_item, ConditionExpression='attribute_not_exists(id)')
+        except client.exceptions.ConditionalCheckFailedException:
+            pass  # Duplicate of a match that was already re-keyed
+        matches_table.delete_item(Key={'id': item['id']})
+    rekeyed = len(legacy_matches)
+    
+    print(f"✓ Re-keyed {rekeyed} legacy matches")
+
+def backfill_rating_aggregates(dynamodb, users_table_name, ratings_table_name):
+    """
+    Recompute every user's running rating aggregates from the ratings table.
+    Run while ratings are not being written, as it overwrites live counters.
+    """
+    ratings_table = dynamodb.Table(ratings_table_name)
+    users_table = dynamodb.Table(users_table_name)
+    
+    aggregates = {}
+    for item in parallel_scan(
+        ratings_table,
+        total_segments=int(os.getenv('SCAN_SEGMENTS', '4')),
+        FilterExpression=Attr('rater_id').exists()
+    ):
+        for user_id, side in ((item['rater_id'], 'given'), (item['rated_id'], 'received')):
+            totals = aggregates.setdefault(user_id, {
+                'ratings_given_count': 0, 'ratings_given_sum': 0, 'matches_given_count': 0,
+                'ratings_received_count': 0, 'ratings_received_sum': 0, 'matches_received_count': 0
+            })
+            totals[f'ratings_{side}_count'] += 1
+            totals[f'ratings_{side}_sum'] += item['rating']
+            totals[f'matches_{side}_count'] += 1 if item['is_match'] else 0
+    
+    for user_id, totals in aggregates.items():
+        try:
+            users_table.update_item(
+                Key={'id': user_id},
+                UpdateExpression='SET ' + ', '.join(f'{name} = :{name}' for name in totals),
+                ConditionExpression='attribute_exists(id)',
+                ExpressionAttributeValues={f':{name}': value for name, value in totals.items()}
+            )
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            pass  # Ratings of a deleted user
+    
+    print(f"✓ Rating aggregates backfilled for {len(aggregates)} users")
+
+def rebuild_global_stats(dynamodb, users_table_name, stats_table_name, cache=None):
+    """
+    Recompute the global stats item (user count, Elo sum, Elo histogram)
+    from the users table, then bump the cache's 'elo' scope so API workers
+    stop serving the old stats (cache defaults to create_cache())
+    """
+    users_table = dynamodb.Table(users_table_name)
+    histogram = EloHistogram()
+    
+    user_count = 0
+    elo_sum = Decimal('0')
+    counts = {}
+    for item in parallel_scan(
+        users_table,
+        total_segments=int(os.getenv('SCAN_SEGMENTS', '4')),
+        ProjectionExpression='elo_rating'
+    ):
+        user_count += 1
+        elo_sum += item['elo_rating']
+        key = histogram.bucket_key(item['elo_rating'])
+        counts[key] = counts.get(key, 0) + 1
+    
+    dynamodb.Table(stats_table_name).put_item(Item={
+        'id': GLOBAL_STATS_ID,
+        'user_count': user_count,
+        'elo_sum': elo_sum,
+        'histogram': counts
+    })
+    (cache or create_cache()).bump('elo')
+    
+    print(f"✓ Global stats rebuilt from {user_count} users")
+
+def main():
+    parser = argparse.ArgumentParser(description='Provision and migrate the EloVe DynamoDB tables')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('migrate', help='Create missing tables and run schema migrations (default)')
+    subparsers.add_parser('create-tables', help='Only create missing tables')
+    subparsers.add_parser('status', help='Show table and index status')
+    subparsers.add_parser('rebuild-stats', help='Recompute rating aggregates and global stats (offline only: stop the API first)')
+    subparsers.add_parser('repair-stats', help='Correct the global stats item with relative updates (safe while the API is serving)')
+    subparsers.add_parser('backfill-pairs', help='One-off: write missing rating pair items for ratings that predate them')
+    args = parser.parse_args()
+    
+    if args.command == 'status':
+        print_status(get_resource().meta.client, table_names())
+    elif args.command == 'rebuild-stats':
+        rebuild_stats(get_resource(), table_names())
+    elif args.command == 'repair-stats':
+        from database import Database  # Only this command needs the app's data layer
+        corrections = Database().repair_global_stats()
+        print(f"✓ Global stats repaired: {corrections['user_count']:+d} users, "
+              f"{corrections['elo_sum']:+.2f} Elo sum, {corrections['buckets']} histogram buckets corrected")
+    elif args.command == 'backfill-pairs':
+        backfill_rating_pairs(get_resource(), table_names()['ratings'])
+    else:
+        setup_dynamodb_tables(migrate=args.command != 'create-tables')
+
 if __name__ == "__main__":
-    setup_dynamodb_tables()
+    main()
@@ -102,6 +102,25 @@ def test_api():
             
             time.sleep(0.5)  # Small delay between requests
     
+    # Submit several swipes in one request
+    if len(created_users) >= 5:
+        batch_data = {
+            "rater_id": created_users[3]['id'],
+            "ratings": [
+                {"rated_id": created_users[0]['id'], "rating": 8, "is_match": True},
+                {"rated_id": created_users[1]['id'], "rating": 4, "is_match": False},
+                {"rated_id": created_users[3]['id'], "rating": 9, "is_match": True},  # Self-rating, rejected
+                {"rated_id": created_users[4]['id'], "rating": 6, "is_match": True}
+            ]
+        }
+        response = requests.post(f"{BASE_URL}/rate/batch", json=batch_data)
+        if response.status_code == 200:
+            result = response.json()
+            print(f"  Batch from {created_users[3]['name']}: {result['applied']}/{len(batch_data['ratings'])} applied, "
+                  f"Elo change {result['rating_change_rater']:+.1f}")
+            for item in result['results']:
+                print(f"    {item.get('rated_id')}: {'ok' if item['success'] else item['error']}")
+    
     # Test leaderboard
     print(f"\n6. Testing leaderboard...")
     response = requests.get(f"{BASE_URL}/leaderboard")
@@ -111,6 +130,23 @@ def test_api():
         for user in leaderboard['leaderboard'][:5]:  # Top 5
             print(f"  #{user['rank']} {user['name']} - {user['elo_rating']:.1f} Elo ({user['tier']})")
     
+    # Walk the leaderboard two users at a time to check ranks carry across pages
+    ranks = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = requests.get(f"{BASE_URL}/leaderboard", params=params)
+        if response.status_code != 200:
+            break
+        page = response.json()
+        ranks.extend(user['rank'] for user in page['leaderboard'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    print(f"Paginated leaderboard: {len(ranks)} users, ranks contiguous: {ranks == list(range(1, len(ranks) + 1))}")
+    
     # Test user stats
     print(f"\n7. Testing user statistics...")
     if created_users:
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for the ASGI server mode that need no DynamoDB: request validation in
+the async handlers, the WSGI bridge to the Flask app, and AsyncDatabase
+running independent calls concurrently
+"""
+
+import asyncio
+import json
+import threading
+
+from asgi_app import AsyncDatabase, app, wsgi_environ
+
+def request(method, path, body=None):
+    """Send one HTTP request through the ASGI app; returns (status, headers, body), JSON bodies decoded"""
+    payload = json.dumps(body).encode('utf-8') if body is not None else b''
+    scope = {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode('utf-8'),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [
+            (b'host', b'localhost'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(payload)).encode('ascii'))
+        ],
+        'server': ('localhost', 5000),
+        'client': ('127.0.0.1', 12345)
+    }
+    messages = [{'type': 'http.request', 'body': payload, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = sent[0]
+    headers = dict(start['headers'])
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    if headers.get(b'content-type', b'').startswith(b'application/json'):
+        body = json.loads(body)
+    return start['status'], headers, body
+
+def test_async_health():
+    status, headers, body = request('GET', '/api/health')
+    assert status == 200
+    assert body['success'] and 'cache' in body
+    assert headers[b'access-control-allow-origin'] == b'*'
+
+def test_async_rate_validation():
+    status, _, body = request('POST', '/api/rate', {'rater_id': 'a'})
+    assert status == 400
+    assert 'required' in body['error']
+
+    status, _, body = request('POST', '/api/rate', {'rater_id': 'a', 'rated_id': 'a', 'rating': 5, 'is_match': True})
+    assert status == 400
+    assert body['error'] == 'Users cannot rate themselves'
+
+    status, _, body = request('POST', '/api/rate/preview', {'rater_id': 'a', 'rated_id': 'b', 'rating': 11, 'is_match': True})
+    assert status == 400
+    assert body['error'] == 'Rating must be between 1 and 10'
+
+def test_bridged_route_reaches_flask():
+    # /api/users/batch has no async handler, so Flask answers it
+    status, _, body = request('POST', '/api/users/batch', {'ids': 'not-a-list'})
+    assert status == 400
+    assert body['error'] == 'ids list is required'
+
+    status, _, _ = request('GET', '/api/does-not-exist')
+    assert status == 404
+
+def test_wsgi_path_is_percent_decoded():
+    scope = {
+        'type': 'http',
+        'method': 'GET',
+        'path': '/api/users/jos\u00e9 1',
+        'raw_path': b'/api/users/jos%C3%A9%201',
+        'query_string': b'limit=5'
+    }
+    environ = wsgi_environ(scope, b'')
+    assert environ['PATH_INFO'] == '/api/users/jos\u00e9 1'.encode('utf-8').decode('latin-1')
+    assert environ['QUERY_STRING'] == 'limit=5'
+
+def test_async_database_runs_calls_concurrently():
+    # Every lookup waits until all five are in flight, so serialized calls
+    # break the barrier instead of just running slowly
+    barrier = threading.Barrier(5, timeout=5)
+
+    class BlockingDatabase:
+        def lookup(self, value):
+            barrier.wait()
+            return value
+
+    adb = AsyncDatabase(BlockingDatabase(), max_workers=5)
+
+    async def lookup_all():
+        return await asyncio.gather(*(adb.lookup(i) for i in range(5)))
+
+    assert asyncio.run(lookup_all()) == [0, 1, 2, 3, 4]
+    adb.close()
+
+if __name__ == "__main__":
+    test_async_health()
+    test_async_rate_validation()
+    test_bridged_route_reaches_flask()
+    test_wsgi_path_is_percent_decoded()
+    test_async_database_runs_calls_concurrently()
+    print("✓ ASGI tests passed")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for the cache layer: both backends round-trip values (including
+DynamoDB Decimals) and a version bump from one worker invalidates scoped
+entries for every worker sharing the backend. The Redis backend runs against
+fakeredis, an in-memory stand-in for a Redis server.
+"""
+
+from decimal import Decimal
+
+import pytest
+
+from cache import Cache, InProcessBackend, RedisBackend
+
+def shared_redis_caches():
+    """Two caches standing in for two workers connected to one Redis server"""
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    return (
+        Cache(RedisBackend(fakeredis.FakeRedis(server=server))),
+        Cache(RedisBackend(fakeredis.FakeRedis(server=server)))
+    )
+
+def check_round_trip(cache):
+    user = {'id': 'u1', 'age': Decimal('25'), 'elo_rating': 1234.5, 'tags': [Decimal('1.5')]}
+    cache.set('user', 'u1', user)
+    assert cache.get('user', 'u1') == user
+    assert isinstance(cache.get('user', 'u1')['age'], Decimal)
+    assert cache.get_many('user', ['u1', 'u2']) == {'u1': user}
+
+    cache.invalidate('user', 'u1')
+    assert cache.get('user', 'u1') is None
+
+def test_in_process_round_trip():
+    check_round_trip(Cache(InProcessBackend()))
+
+def test_redis_round_trip():
+    worker, _ = shared_redis_caches()
+    check_round_trip(worker)
+
+def test_bump_invalidates_other_workers():
+    worker_a, worker_b = shared_redis_caches()
+
+    scope = worker_a.scope('elo')
+    worker_a.set('leaderboard', '50:', {'users': [1, 2, 3]}, scope=scope)
+    assert worker_b.get('leaderboard', '50:', scope=worker_b.scope('elo')) == {'users': [1, 2, 3]}
+
+    worker_b.bump('elo')
+    assert worker_a.get('leaderboard', '50:', scope=worker_a.scope('elo')) is None
+
+def test_value_read_before_bump_is_not_served():
+    cache = Cache(InProcessBackend())
+
+    scope = cache.scope('elo')  # Resolved before the (slow) database read
+    cache.bump('elo')           # A concurrent Elo update lands meanwhile
+    cache.set('stats', 'global', {'user_count': 1}, scope=scope)
+
+    assert cache.get('stats', 'global', scope=cache.scope('elo')) is None
+
+def test_size_bound_and_ttl():
+    cache = Cache(InProcessBackend(max_size=2), ttl=60)
+    for key in ('a', 'b', 'c'):
+        cache.set('user', key, key)
+    assert cache.get('user', 'a') is None
+    assert cache.stats['evictions'] == 1
+
+    cache.set('user', 'expired', 1, ttl=-1)
+    assert cache.get('user', 'expired') is None
+
+if __name__ == "__main__":
+    test_in_process_round_trip()
+    test_redis_round_trip()
+    test_bump_invalidates_other_workers()
+    test_value_read_before_bump_is_not_served()
+    test_size_bound_and_ttl()
+    print("✓ Cache tests passed")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Property test for the vectorized Elo engine: the batch API must agree with
+the scalar calculate_new_ratings on random interactions. Running the file
+directly also reports the batch speedup over a scalar loop.
+"""
+
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from elo_system import EloSystem
+
+def random_interactions(count, seed):
+    """Random interactions, biased towards the K-factor and clamp boundaries"""
+    rng = random.Random(seed)
+    boundary_ratings = [100, 101, 1399.99, 1400, 1799.99, 1800, 2999, 3000]
+
+    def random_rating():
+        if rng.random() < 0.2:
+            return rng.choice(boundary_ratings)
+        return rng.uniform(100, 3000)
+
+    return (
+        [random_rating() for _ in range(count)],
+        [random_rating() for _ in range(count)],
+        [rng.randint(1, 10) for _ in range(count)],
+        [rng.random() < 0.5 for _ in range(count)]
+    )
+
+def test_batch_matches_scalar():
+    """Batch results equal the scalar path for every interaction"""
+    elo = EloSystem()
+
+    for seed in range(20):
+        raters, rateds, scores, outcomes = random_interactions(500, seed)
+        batch_raters, batch_rateds = elo.calculate_new_ratings_batch(raters, rateds, scores, outcomes)
+
+        for i in range(len(raters)):
+            scalar_rater, scalar_rated = elo.calculate_new_ratings(raters[i], rateds[i], scores[i], outcomes[i])
+            assert abs(batch_raters[i] - scalar_rater) <= 1e-9, (seed, i)
+            assert abs(batch_rateds[i] - scalar_rated) <= 1e-9, (seed, i)
+
+def test_import_does_not_load_numpy():
+    """Only the batch API needs numpy, so importing the module must not pay for it"""
+    code = "import sys, elo_system; sys.exit('numpy' in sys.modules)"
+    here = os.path.dirname(os.path.abspath(__file__))
+    assert subprocess.run([sys.executable, '-c', code], cwd=here).returncode == 0
+
+def benchmark_batch_throughput():
+    """
+    Time the batch API against a scalar loop over the same interactions.
+    Reported, not asserted: wall-clock ratios vary too much between machines
+    to gate the suite on. Run this file directly to see the numbers.
+    """
+    elo = EloSystem()
+    raters, rateds, scores, outcomes = random_interactions(200000, seed=42)
+
+    start = time.perf_counter()
+    for i in range(len(raters)):
+        elo.calculate_new_ratings(raters[i], rateds[i], scores[i], outcomes[i])
+    scalar_seconds = time.perf_counter() - start
+
+    arrays = (np.array(raters), np.array(rateds), np.array(scores), np.array(outcomes))
+    start = time.perf_counter()
+    elo.calculate_new_ratings_batch(*arrays)
+    batch_seconds = time.perf_counter() - start
+
+    speedup = scalar_seconds / batch_seconds
+    print(f"Scalar: {scalar_seconds:.3f}s, batch: {batch_seconds:.4f}s ({speedup:.0f}x)")
+    return speedup
+
+if __name__ == "__main__":
+    test_batch_matches_scalar()
+    print("✓ Batch Elo results match the scalar path")
+    benchmark_batch_throughput()
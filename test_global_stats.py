@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for the global stats item against moto's in-memory DynamoDB: failed
+updates are counted for /api/health, repair_global_stats corrects drift, and
+user lists get percentiles from the histogram
+"""
+
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip('moto')
+
+from database import GLOBAL_STATS_ID
+
+def test_repair_corrects_drift(db):
+    for i in range(3):
+        db.create_user(f'user-{i}', 25)
+    # Drift: a lost update for one user plus a stray histogram bucket
+    db.stats_table.put_item(Item={
+        'id': GLOBAL_STATS_ID,
+        'user_count': 2,
+        'elo_sum': Decimal('2400'),
+        'histogram': {'1200': 2, '1500': 1}
+    })
+
+    corrections = db.repair_global_stats()
+    assert corrections['user_count'] == 1
+
+    stats = db.get_global_stats()
+    assert stats['user_count'] == 3
+    assert stats['elo_sum'] == 3600
+    assert stats['histogram'].counts == {1200: 3}
+
+def test_failed_updates_are_counted(db, monkeypatch):
+    user_id = db.create_user('user', 25)
+
+    def throttled(**kwargs):
+        raise RuntimeError('ProvisionedThroughputExceededException')
+
+    monkeypatch.setattr(db.stats_table, 'update_item', throttled)
+    db.update_elo_rating(user_id, 1300)
+    assert db.global_stats_health['update_failures'] == 1
+
+def test_user_lists_include_percentile(db, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, 'db', db)
+    low, high = db.create_user('low', 25), db.create_user('high', 25)
+    db.update_elo_rating(high, 1300)
+    client = app_module.app.test_client()
+
+    leaderboard = client.get('/api/leaderboard').get_json()['leaderboard']
+    assert [(user['id'], user['percentile']) for user in leaderboard] == [(high, 50.0), (low, 0.0)]
+
+    users = client.post('/api/users/batch', json={'ids': [low, high]}).get_json()['users']
+    assert [user['percentile'] for user in users] == [0.0, 50.0]
+
+if __name__ == "__main__":
+    pytest.main([__file__, '-q'])
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-process rank index against moto's in-memory DynamoDB: on a
+cold worker no request may be answered from an index that was never loaded,
+and top-N pages come back in rank order
+"""
+
+import threading
+
+import pytest
+
+pytest.importorskip('moto')
+
+from database import Database
+
+def test_cold_rank_lookups_wait_for_first_load(db):
+    user_ids = [db.create_user(f'user-{i}', 25) for i in range(10)]
+
+    # A fresh worker: its index only knows users it wrote itself
+    worker = Database()
+    worker.ranked_leaderboard.update(user_ids[0], 1200)
+
+    results = {}
+
+    def lookup(user_id):
+        results[user_id] = worker.get_user_rank(user_id)
+
+    threads = [threading.Thread(target=lookup, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(results[user_id] is not None for user_id in user_ids)
+    assert {result['total_users'] for result in results.values()} == {10}
+
+def test_top_ranked_pages_by_offset(db):
+    user_ids = [db.create_user(f'user-{i}', 25) for i in range(5)]
+    for i, user_id in enumerate(user_ids):
+        db.update_elo_rating(user_id, 1000 + 100 * i)
+
+    page = db.get_top_ranked(limit=2, offset=1)
+    assert [(user['id'], user['rank']) for user in page] == [(user_ids[3], 2), (user_ids[2], 3)]
+
+if __name__ == "__main__":
+    pytest.main([__file__, '-q'])
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for batch ratings against moto's in-memory DynamoDB: a batch must
+leave the same aggregates as the same ratings sent one at a time through
+record_rating (the /api/rate path), and write its rating records, pair items
+and matches along with the Elo updates
+"""
+
+import pytest
+
+pytest.importorskip('moto')
+
+from database import AGGREGATE_ATTRIBUTES, rating_pair_key
+from elo_system import EloSystem
+
+def aggregates(db, user_id):
+    item = db.users_table.get_item(Key={'id': user_id})['Item']
+    return {name: item.get(name, 0) for name in AGGREGATE_ATTRIBUTES}
+
+def test_batch_aggregates_match_single_ratings(db):
+    elo = EloSystem()
+    ratings = [('x', 7, True), ('y', 4, False), ('x', 9, False)]
+
+    batch_ids = {name: db.create_user(f'batch-{name}', 25) for name in ('rater', 'x', 'y')}
+    single_ids = {name: db.create_user(f'single-{name}', 25) for name in ('rater', 'x', 'y')}
+
+    batch = db.record_ratings(
+        batch_ids['rater'],
+        [(batch_ids[rated], rating, is_match) for rated, rating, is_match in ratings],
+        elo.calculate_new_ratings
+    )
+    assert all('error' not in result for result in batch['results'])
+
+    for rated, rating, is_match in ratings:
+        assert db.record_rating(single_ids['rater'], single_ids[rated], rating, is_match, elo.calculate_new_ratings)
+
+    for name in ('rater', 'x', 'y'):
+        assert aggregates(db, batch_ids[name]) == aggregates(db, single_ids[name]), name
+
+    rater = aggregates(db, batch_ids['rater'])
+    assert (rater['ratings_given_count'], rater['ratings_given_sum'], rater['matches_given_count']) == (3, 20, 1)
+    rated = aggregates(db, batch_ids['x'])
+    assert (rated['ratings_received_count'], rated['ratings_received_sum'], rated['matches_received_count']) == (2, 16, 1)
+
+def test_batch_writes_ratings_and_matches(db):
+    elo = EloSystem()
+    rater, x, y = (db.create_user(name, 25) for name in ('rater', 'x', 'y'))
+    db.record_rating(y, rater, 8, True, elo.calculate_new_ratings)
+
+    batch = db.record_ratings(rater, [(x, 7, True), (y, 6, True), (x, 3, False)], elo.calculate_new_ratings)
+
+    for result in batch['results']:
+        assert 'Item' in db.ratings_table.get_item(Key={'id': result['rating_id']})
+    # x was rated twice: the pair item holds the later rating
+    pair = db.ratings_table.get_item(Key={'id': rating_pair_key(rater, x)})['Item']
+    assert pair['rating_id'] == batch['results'][2]['rating_id'] and not pair['is_match']
+    assert [result['match_id'] is not None for result in batch['results']] == [False, True, False]
+
+def test_batch_endpoint_rejects_bad_ids_per_item(db, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, 'db', db)
+    monkeypatch.setattr(app_module, 'rating_log_queue', None)
+    rater, rated = db.create_user('rater', 25), db.create_user('rated', 25)
+
+    response = app_module.app.test_client().post('/api/rate/batch', json={
+        'rater_id': rater,
+        'ratings': [
+            {'rated_id': ['not', 'hashable'], 'rating': 5, 'is_match': False},
+            {'rated_id': '', 'rating': 5, 'is_match': False},
+            {'rated_id': 7, 'rating': 5, 'is_match': False},
+            {'rated_id': rated, 'rating': 5, 'is_match': False}
+        ]
+    })
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['success'] for result in results] == [False, False, False, True]
+    assert results[0]['error'] == 'rated_id must be a non-empty string'
+
+    response = app_module.app.test_client().post('/api/rate/batch', json={'rater_id': {'a': 1}, 'ratings': [{}]})
+    assert response.status_code == 400
+
+if __name__ == "__main__":
+    pytest.main([__file__, '-q'])
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Tests for rating history paging against moto's in-memory DynamoDB: pages
+never exceed the limit and, together, return every rating exactly once
+"""
+
+import pytest
+
+pytest.importorskip('moto')
+
+from elo_system import EloSystem
+
+def test_history_pages_are_capped_and_complete(db):
+    elo = EloSystem()
+    user = db.create_user('user', 25)
+    others = [db.create_user(f'other-{i}', 25) for i in range(4)]
+
+    expected = set()
+    for other in others:
+        expected.add(db.record_rating(user, other, 6, False, elo.calculate_new_ratings)['rating_id'])
+        expected.add(db.record_rating(other, user, 7, True, elo.calculate_new_ratings)['rating_id'])
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = db.get_rating_history(user, limit=3, cursor=cursor)
+        assert len(page) <= 3
+        assert [rating['created_at'] for rating in page] == sorted((rating['created_at'] for rating in page), reverse=True)
+        seen.extend(rating['id'] for rating in page)
+        if cursor is None:
+            break
+
+    assert len(seen) == len(expected) and set(seen) == expected
+
+if __name__ == "__main__":
+    pytest.main([__file__, '-q'])
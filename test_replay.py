@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Tests for Elo snapshots against moto's in-memory DynamoDB: a snapshot of the
+stored Elo plus the ratings after it reconstructs the current Elo exactly
+"""
+
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('moto')
+
+from elo_system import EloSystem
+from replay_elo import reconstruct, snapshot_stored
+
+def stored_elo(db):
+    return {item['id']: float(item['elo_rating']) for item in db.scan_all(db.users_table)}
+
+def test_stored_snapshot_plus_tail_matches_stored_elo(db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Snapshots go to ./snapshots
+    elo = EloSystem()
+    users = [db.create_user(f'user-{i}', 25) for i in range(4)]
+
+    db.record_rating(users[0], users[1], 8, True, elo.calculate_new_ratings)
+    db.record_rating(users[2], users[0], 3, False, elo.calculate_new_ratings)
+    path = snapshot_stored(db, elo)
+
+    db.record_rating(users[1], users[3], 9, True, elo.calculate_new_ratings)
+    db.record_rating(users[0], users[1], 5, False, elo.calculate_new_ratings)
+
+    reconstructed, used, tail = reconstruct(db, elo, datetime.utcnow().isoformat())
+    assert used == path and tail == 2
+    expected = stored_elo(db)
+    assert {user_id: round(reconstructed[user_id], 9) for user_id in expected} == \
+        {user_id: round(rating, 9) for user_id, rating in expected.items()}
+
+if __name__ == "__main__":
+    pytest.main([__file__, '-q'])
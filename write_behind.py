@@ -0,0 +1,136 @@
+import atexit
+import os
+import queue
+import threading
+import time
+
+# Tells a worker to exit once everything queued before it has been handled
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """
+    Bounded in-process queue whose background workers hand queued tasks to a
+    handler in batches, so callers can respond before non-critical writes land
+
+    When the queue is full, submit() runs the task on the caller's thread
+    instead of dropping it (backpressure: a burst slows requests down rather
+    than losing writes or growing memory without bound). Queued tasks are
+    flushed when the process exits normally.
+    """
+
+    def __init__(self, handler, max_size=None, batch_size=None, workers=None, max_attempts=3):
+        """
+        handler: Callable taking a list of tasks; raising retries the whole batch
+        max_size: Tasks allowed to wait in the queue
+        batch_size: Most tasks passed to one handler call
+        workers: Background threads draining the queue
+        max_attempts: Handler calls per batch before it is given up on
+        """
+        self.handler = handler
+        self.batch_size = batch_size or int(os.getenv('WRITE_BEHIND_BATCH_SIZE', '25'))
+        self.max_attempts = max_attempts
+        self._queue = queue.Queue(maxsize=max_size or int(os.getenv('WRITE_BEHIND_QUEUE_SIZE', '1000')))
+        self._stats_lock = threading.Lock()
+        self._stats = {'queued': 0, 'inline': 0, 'written': 0, 'failed': 0}
+        self._closed = False
+
+        self._workers = [
+            threading.Thread(target=self._drain, daemon=True)
+            for _ in range(workers or int(os.getenv('WRITE_BEHIND_WORKERS', '2')))
+        ]
+        for worker in self._workers:
+            worker.start()
+        atexit.register(self.close)
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def submit(self, task):
+        """
+        Queue a task; run it inline if the queue is full or closed
+
+        Returns:
+            bool: True if queued, False if it was handled on the caller's thread
+        """
+        if not self._closed:
+            try:
+                self._queue.put_nowait(task)
+                self._count('queued')
+                return True
+            except queue.Full:
+                pass
+
+        self._count('inline')
+        self._handle([task])
+        return False
+
+    def _handle(self, batch):
+        for attempt in range(self.max_attempts):
+            try:
+                self.handler(batch)
+                self._count('written', len(batch))
+                return
+            except Exception as e:
+                print(f"Error in write-behind batch (attempt {attempt + 1}): {e}")
+                time.sleep(0.1 * (2 ** attempt))
+        self._count('failed', len(batch))
+
+    def _drain(self):
+        while True:
+            task = self._queue.get()
+            if task is _STOP:
+                self._queue.task_done()
+                return
+
+            # Take whatever else is already waiting, up to one batch
+            batch = [task]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    task = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if task is _STOP:
+                    stop = True
+                    break
+                batch.append(task)
+
+            try:
+                self._handle(batch)
+            finally:
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """Block until every task queued so far has been handled"""
+        self._queue.join()
+
+    def close(self):
+        """Stop accepting tasks, handle everything still queued and stop the workers"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._workers:
+            self._queue.put(_STOP)
+        for worker in self._workers:
+            worker.join()
+        # Tasks that raced past the closed check
+        while True:
+            try:
+                task = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._handle([task])
+            self._queue.task_done()
+
+    @property
+    def stats(self):
+        """Counters plus the current queue depth"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['pending'] = self._queue.qsize()
+        return stats